@@ -120,7 +120,7 @@ class LessonInline(admin.TabularInline):
 
 class TeacherAdmin(SummernoteModelAdmin):
     summernote_fields = ("description",)
-    list_display = ("user", "full_name", "status")
+    list_display = ("user", "full_name", "status", "unread_messages")
     search_fields = ("full_name",)
     inlines = [TeacherContactInline, LessonInline]
 
@@ -172,18 +172,39 @@ class LessonAdmin(admin.ModelAdmin):
 
 
 class TeacherContactAdmin(admin.ModelAdmin):
-    list_display = ("teacher", "student", "student_name", "subject")
+    list_display = ("teacher", "student", "student_name", "subject", "is_read")
+    list_filter = ("is_read",)
 
 
 class AttendanceRecordAdmin(admin.ModelAdmin):
-    list_display = ("student", "lesson", "status", "created_date")
+    list_display = ("student", "lesson", "session", "status", "created_date")
     list_filter = ("status", "lesson")
+    raw_id_fields = ("session",)
+
+
+class ClassSessionAdmin(admin.ModelAdmin):
+    list_display = ("lesson", "date", "period", "created_date")
+    list_filter = ("period", "lesson")
 
 
 class NewUserAdmin(admin.ModelAdmin):
     list_display = ("user", "full_name", "phone_number", "created_date")
 
 
+class StudentSummaryAdmin(admin.ModelAdmin):
+    list_display = (
+        "student",
+        "lesson_count",
+        "great_count",
+        "good_count",
+        "average_count",
+        "absent_count",
+        "average_score",
+        "updated_date",
+    )
+    readonly_fields = ("student",) + models.StudentSummary.COUNTER_FIELDS
+
+
 admin.site.register(models.User, CustomUserAdmin)
 admin.site.register(models.ProfileAdmin, CustomUserProfile)
 admin.site.register(models.Teacher, TeacherAdmin)
@@ -194,4 +215,6 @@ admin.site.register(models.TeacherContact, TeacherContactAdmin)
 admin.site.register(models.Lesson, LessonAdmin)
 admin.site.register(models.Grade, GradeAdmin)
 admin.site.register(models.AttendanceRecord, AttendanceRecordAdmin)
+admin.site.register(models.ClassSession, ClassSessionAdmin)
 admin.site.register(models.NewUser, NewUserAdmin)
+admin.site.register(models.StudentSummary, StudentSummaryAdmin)
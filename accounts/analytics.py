@@ -0,0 +1,329 @@
+import jdatetime
+import numpy as np
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Avg, Count, Max, Min, Q
+
+from .models import (
+    AttendanceRecord,
+    Grade,
+    Lesson,
+    Student,
+    school_today,
+    grade_distribution_version,
+    SCHOOL_MONTHS,
+)
+
+
+REPORT_LEVELS = ("lesson", "grade", "student")
+REPORT_FIELDS = (
+    "label",
+    "total",
+    "absence_rate",
+    "lateness_rate",
+    "longest_streak",
+    "trend",
+)
+
+
+def term_start(today=None):
+    """first day of the school year (1 mehr) that contains `today`"""
+    today = today or school_today()
+    year = today.year if today.month >= 7 else today.year - 1
+    return jdatetime.date(year, 7, 1)
+
+
+def _fetch_columns(start, end):
+    """
+    load (student, lesson, grade level, day, status) of every record in the
+    term with one query, straight from the cursor so no model instance or
+    field converter runs per row.
+    """
+    queryset = (
+        AttendanceRecord.objects.filter(
+            session__date__gte=start, session__date__lte=end
+        )
+        .order_by()
+        .values_list(
+            "student_id", "lesson_id", "student__grade", "session__date", "status"
+        )
+    )
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    if not rows:
+        return None
+
+    student, lesson, grade, day, status = zip(*rows)
+    return {
+        "student": np.array(student, dtype=np.int64),
+        "lesson": np.array(lesson, dtype=np.int64),
+        "grade": np.array(grade),
+        "day": np.array(day, dtype="datetime64[D]"),
+        "status": np.array(status),
+    }
+
+
+def _longest_streaks(unit, group, day, absent, size):
+    """
+    longest run of consecutive absences inside each `unit` (records ordered
+    by day), reduced to the maximum per `group`.
+    """
+    order = np.lexsort((day, unit))
+    unit, group, absent = unit[order], group[order], absent[order]
+
+    starts = absent.copy()
+    starts[1:] &= ~absent[:-1] | (unit[1:] != unit[:-1])
+    run_ids = np.cumsum(starts)[absent] - 1
+    lengths = np.bincount(run_ids)
+
+    streaks = np.zeros(size, dtype=np.int64)
+    np.maximum.at(streaks, group[starts], lengths)
+    return streaks
+
+
+def _summarize(group, labels, columns, streak_unit):
+    size = len(labels)
+    absent = columns["status"] == "absent"
+    late = columns["status"] == "late"
+
+    total = np.bincount(group, minlength=size)
+    absences = np.bincount(group, weights=absent, minlength=size)
+    lateness = np.bincount(group, weights=late, minlength=size)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        absence_rate = np.where(total > 0, absences / total, 0.0)
+        lateness_rate = np.where(total > 0, lateness / total, 0.0)
+
+    # تغییر نرخ غیبت هفته آخر نسبت به هفته قبل از آن
+    weeks_ago = (columns["day"].max() - columns["day"]).astype(np.int64) // 7
+    trend = np.zeros(size)
+    for weeks, sign in ((0, 1), (1, -1)):
+        in_week = weeks_ago == weeks
+        week_total = np.bincount(group[in_week], minlength=size)
+        week_absent = np.bincount(
+            group[in_week], weights=absent[in_week], minlength=size
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            trend += sign * np.where(week_total > 0, week_absent / week_total, 0.0)
+
+    streaks = _longest_streaks(streak_unit, group, columns["day"], absent, size)
+
+    return [
+        {
+            "label": labels[i],
+            "total": int(total[i]),
+            "absence_rate": round(float(absence_rate[i]) * 100, 1),
+            "lateness_rate": round(float(lateness_rate[i]) * 100, 1),
+            "longest_streak": int(streaks[i]),
+            "trend": round(float(trend[i]) * 100, 1),
+        }
+        for i in np.argsort(-absence_rate, kind="stable")
+        if total[i]
+    ]
+
+
+def attendance_report(start=None, end=None):
+    """
+    term attendance report per lesson, grade level and student. every rate
+    and streak is computed with numpy over one columnar fetch.
+    """
+    start = start or term_start()
+    end = end or school_today()
+    columns = _fetch_columns(start, end)
+    if columns is None:
+        return {level: [] for level in REPORT_LEVELS}
+
+    students, student_idx = np.unique(columns["student"], return_inverse=True)
+    lessons, lesson_idx = np.unique(columns["lesson"], return_inverse=True)
+    grades, grade_idx = np.unique(columns["grade"], return_inverse=True)
+
+    lesson_names = Lesson.objects.in_bulk(lessons.tolist())
+    student_names = Student.objects.in_bulk(students.tolist())
+    # هر دانش آموز در هر درس یک دنباله جداگانه دارد
+    student_lesson = student_idx * len(lessons) + lesson_idx
+
+    return {
+        "lesson": _summarize(
+            lesson_idx,
+            [str(lesson_names.get(pk, pk)) for pk in lessons.tolist()],
+            columns,
+            student_lesson,
+        ),
+        "grade": _summarize(
+            grade_idx, [str(grade) for grade in grades], columns, student_lesson
+        ),
+        "student": _summarize(
+            student_idx,
+            [str(student_names.get(pk, pk)) for pk in students.tolist()],
+            columns,
+            student_lesson,
+        ),
+    }
+
+
+PASS_SCORE = 10
+HISTOGRAM_EDGES = np.arange(0, 22, 2)
+DISTRIBUTION_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _group_stats(group, values, size):
+    """mean, median, standard deviation and pass rate of `values` per group"""
+    count = np.bincount(group, minlength=size)
+    safe = np.maximum(count, 1)
+    mean = np.bincount(group, weights=values, minlength=size) / safe
+    square = np.bincount(group, weights=values * values, minlength=size) / safe
+    std = np.sqrt(np.maximum(square - mean * mean, 0.0))
+    passed = np.bincount(group, weights=values >= PASS_SCORE, minlength=size) / safe
+
+    # میانه هر گروه از روی مقادیر مرتب شده همان گروه، صفر انتهایی برای اینکه
+    # اندیس گروه خالی آخر از آرایه بیرون نزند
+    ordered = np.append(values[np.lexsort((values, group))], 0.0)
+    start = np.concatenate(([0], np.cumsum(count)[:-1]))
+    low = start + np.maximum(count - 1, 0) // 2
+    high = start + count // 2
+    median = np.where(count > 0, (ordered[low] + ordered[high]) / 2, 0.0)
+
+    buckets = len(HISTOGRAM_EDGES) - 1
+    bucket = np.clip(
+        np.searchsorted(HISTOGRAM_EDGES, values, side="right") - 1, 0, buckets - 1
+    )
+    histogram = np.bincount(group * buckets + bucket, minlength=size * buckets)
+    histogram = histogram.reshape(size, buckets)
+
+    return [
+        {
+            "mean": round(float(mean[i]), 2),
+            "median": round(float(median[i]), 2),
+            "std": round(float(std[i]), 2),
+            "pass_rate": round(float(passed[i]) * 100, 1),
+            "histogram": histogram[i].tolist(),
+        }
+        for i in range(size)
+    ]
+
+
+def _compute_distribution(lesson_id):
+    rows = list(
+        Grade.objects.filter(lesson_id=lesson_id)
+        .order_by()
+        .values_list("month", "score", "class_activity")
+    )
+    present = {row[0] for row in rows}
+    months = [month for month in SCHOOL_MONTHS if month in present]
+    month_index = {month: i for i, month in enumerate(months)}
+
+    if rows:
+        month, score, class_activity = zip(*rows)
+        group = np.array([month_index[value] for value in month], dtype=np.int64)
+        score = np.array(score, dtype=float)
+        class_activity = np.array(class_activity, dtype=float)
+    else:
+        group = np.zeros(0, dtype=np.int64)
+        score = class_activity = np.zeros(0)
+    # گروه آخر همه ماه ها با هم است
+    everything = np.full(len(group), len(months), dtype=np.int64)
+    group = np.concatenate((group, everything))
+    size = len(months) + 1
+    counts = np.bincount(group, minlength=size)
+
+    score_stats = _group_stats(group, np.concatenate((score, score)), size)
+    activity_stats = _group_stats(
+        group, np.concatenate((class_activity, class_activity)), size
+    )
+    labels = months + ["کل"]
+    summary = [
+        {
+            "month": labels[i],
+            "count": int(counts[i]),
+            "score": score_stats[i],
+            "class_activity": activity_stats[i],
+        }
+        for i in range(size)
+    ]
+    return {
+        "lesson": lesson_id,
+        "pass_score": PASS_SCORE,
+        "buckets": [
+            f"{low}-{high}"
+            for low, high in zip(
+                HISTOGRAM_EDGES[:-1].tolist(), HISTOGRAM_EDGES[1:].tolist()
+            )
+        ],
+        "months": summary[:-1],
+        "total": summary[-1],
+    }
+
+
+def grade_distribution(lesson_id):
+    """
+    score and class activity distribution of a lesson per month, cached
+    under the lesson's version which every grade change bumps.
+    """
+    key = f"grade-distribution:{lesson_id}:{grade_distribution_version(lesson_id)}"
+    distribution = cache.get(key)
+    if distribution is None:
+        distribution = _compute_distribution(lesson_id)
+        cache.set(key, distribution, DISTRIBUTION_CACHE_TIMEOUT)
+    return distribution
+
+
+def _rounded(value):
+    return None if value is None else round(value, 1)
+
+
+def score_statistics(grades, bands, top=8):
+    """
+    summary of a filtered set of grades for the cards and charts of the score
+    list: count, average, highest and lowest score, the number of grades in
+    each of `bands` (name -> filter kwargs), the average of every month and
+    the `top` best student averages. three queries whatever the size.
+    """
+    grades = grades.order_by()
+    totals = grades.aggregate(
+        count=Count("id"),
+        average=Avg("score"),
+        highest=Max("score"),
+        lowest=Min("score"),
+        **{
+            f"band_{name}": Count("id", filter=Q(**band))
+            for name, band in bands.items()
+        },
+    )
+    monthly = {
+        row["month"]: row
+        for row in grades.values("month").annotate(
+            average=Avg("score"), count=Count("id")
+        )
+    }
+    students = (
+        grades.values("student_id", "student__first_name", "student__last_name")
+        .annotate(average=Avg("score"))
+        .order_by("-average", "student_id")[:top]
+    )
+    return {
+        "count": totals["count"],
+        "average": _rounded(totals["average"]),
+        "highest": totals["highest"],
+        "lowest": totals["lowest"],
+        "bands": {name: totals[f"band_{name}"] for name in bands},
+        "months": [
+            (
+                {
+                    "month": month,
+                    "average": _rounded(monthly[month]["average"]),
+                    "count": monthly[month]["count"],
+                }
+                if month in monthly
+                else {"month": month, "average": None, "count": 0}
+            )
+            for month in SCHOOL_MONTHS
+        ],
+        "students": [
+            {
+                "name": f"{row['student__first_name']} {row['student__last_name']}",
+                "average": _rounded(row["average"]),
+            }
+            for row in students
+        ],
+    }
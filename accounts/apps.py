@@ -10,3 +10,5 @@ class AccountsConfig(AppConfig):
     def ready(self):
         admin.site.site_title = "مدرسه امام حسین"
         admin.site.index_title = "پنل مدیریت"
+
+        from . import usernames  # noqa: F401 ثبت سیگنال نام های کاربری
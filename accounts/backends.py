@@ -0,0 +1,20 @@
+from django.contrib.auth.backends import ModelBackend
+
+from .models import User, ROLE_PROFILE_FIELDS
+
+
+class RoleProfileBackend(ModelBackend):
+    """
+    model backend that loads the session user together with every role
+    profile in one joined query, so request.role_profile and templates
+    reading request.user.teachers and the like never query again.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = User._default_manager.select_related(*ROLE_PROFILE_FIELDS).get(
+                pk=user_id
+            )
+        except User.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -1,3 +1,5 @@
+import math
+
 from django import forms
 from .models import Teacher, Grade, Comment
 from django.core import validators
@@ -10,6 +12,22 @@ from django_summernote.widgets import SummernoteWidget
 #         raise forms.ValidationError()
 
 
+def validate_score(score):
+    # nan is neither below 0 nor above 20, so it needs its own check
+    if not math.isfinite(score) or score < 0 or score > 20:
+        raise forms.ValidationError("نمره باید بین ۰ تا ۲۰ باشد.")
+
+
+def validate_class_activity(class_activity):
+    if class_activity is not None:
+        if (
+            not math.isfinite(class_activity)
+            or class_activity < 0
+            or class_activity > 20
+        ):
+            raise forms.ValidationError("نمره کلاسی باید بین ۰ تا ۲۰ باشد.")
+
+
 class RegisterForm(forms.Form):
     username = forms.CharField(
         label="نام کاربری",
@@ -183,18 +201,31 @@ class ScoreUpdateForm(forms.ModelForm):
 
     def clean_score(self):
         score = self.cleaned_data.get("score")
-        if score < 0 or score > 20:
-            raise forms.ValidationError("نمره باید بین ۰ تا ۲۰ باشد.")
+        validate_score(score)
         return score
 
     def clean_class_activity(self):
         class_activity = self.cleaned_data.get("class_activity")
-        if class_activity is not None:
-            if class_activity < 0 or class_activity > 20:
-                raise forms.ValidationError("نمره کلاسی باید بین ۰ تا ۲۰ باشد.")
+        validate_class_activity(class_activity)
         return class_activity
 
 
+class GradeImportForm(forms.Form):
+    file = forms.FileField(
+        label="فایل نمرات (csv)",
+        widget=forms.ClearableFileInput(
+            attrs={"class": "form-control", "accept": ".csv,text/csv"}
+        ),
+        help_text="ستون ها: student,lesson,month,score,class_activity,status",
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        initial=False,
+        label="فقط بررسی فایل (بدون ثبت نمره)",
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"}),
+    )
+
+
 class ChangePasswordForm(forms.Form):
     old_password = forms.CharField(
         widget=forms.PasswordInput(
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.sessions import SessionStore
+
+
+class Command(BaseCommand):
+    help = "delete expired sessions from the database in small chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="number of sessions deleted per query",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.1,
+            help="seconds to wait between chunks so other writers get the lock",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be a positive number")
+        if options["pause"] < 0:
+            raise CommandError("--pause must not be negative")
+
+        deleted = SessionStore.clear_expired(
+            chunk_size=options["chunk_size"], pause=options["pause"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"{deleted} expired sessions deleted"))
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Student
+from accounts.reportcards import generate_report_cards, pdf_available
+
+
+class Command(BaseCommand):
+    help = "render the report cards of a grade level (or every student) in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grade",
+            help='grade level to render, e.g. "دهم کامپیوتر" (default: every student)',
+        )
+        parser.add_argument(
+            "--pdf", action="store_true", help="also render a pdf of each card"
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="number of worker processes (default: one per cpu)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="number of students loaded per batch of queries",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="render again even when the cached card is up to date",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be a positive number")
+        if options["workers"] is not None and options["workers"] < 1:
+            raise CommandError("--workers must be a positive number")
+        if options["pdf"] and not pdf_available():
+            raise CommandError("pdf output needs weasyprint to be installed")
+
+        students = Student.objects.all()
+        if grade := options["grade"]:
+            if grade not in dict(Student._meta.get_field("grade").flatchoices):
+                raise CommandError(f"unknown grade level: {grade}")
+            students = students.filter(grade=grade)
+
+        run = generate_report_cards(
+            students,
+            pdf=options["pdf"],
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            force=options["force"],
+        )
+        for student_id, error in run.failed.items():
+            self.stderr.write(f"student {student_id}: {error}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(run.rendered)} rendered, {len(run.cached)} up to date, "
+                f"{len(run.failed)} failed"
+            )
+        )
@@ -0,0 +1,97 @@
+import csv
+
+from django import forms
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Teacher
+from accounts.services import GRADE_ROW_FIELDS, import_grades_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "import grades from a csv file with the columns "
+        "student,lesson,month,score,class_activity,status "
+        "(student is the username and lesson is the lesson id)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="path of the csv file")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="number of rows validated and inserted per transaction",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="validate the file without writing any grade",
+        )
+        parser.add_argument(
+            "--rejected",
+            help="write rejected rows with their error to this csv file",
+        )
+        parser.add_argument(
+            "--teacher",
+            help="only accept lessons of the teacher with this username",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be a positive number")
+
+        teacher = None
+        if options["teacher"]:
+            try:
+                teacher = Teacher.objects.get(user__username=options["teacher"])
+            except Teacher.DoesNotExist:
+                raise CommandError(f"teacher {options['teacher']} does not exist")
+
+        rejected_file = writer = None
+        if options["rejected"]:
+            rejected_file = open(
+                options["rejected"], "w", newline="", encoding="utf-8-sig"
+            )
+            writer = csv.writer(rejected_file)
+            writer.writerow(("row", *GRADE_ROW_FIELDS, "error"))
+
+        created = rejected = 0
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as f:
+                reports = import_grades_csv(
+                    f,
+                    teacher=teacher,
+                    chunk_size=options["chunk_size"],
+                    dry_run=options["dry_run"],
+                )
+                for report in reports:
+                    created += report.created
+                    rejected += report.error_count
+                    for error in report.errors:
+                        if writer is not None:
+                            writer.writerow(
+                                (
+                                    error.row,
+                                    *(
+                                        error.data.get(name)
+                                        for name in GRADE_ROW_FIELDS
+                                    ),
+                                    error.message,
+                                )
+                            )
+                        elif options["verbosity"] > 1:
+                            self.stderr.write(str(error))
+                    if options["verbosity"] > 1:
+                        self.stdout.write(f"{created + rejected} rows processed")
+        except OSError as e:
+            raise CommandError(str(e))
+        except forms.ValidationError as e:
+            raise CommandError(" ".join(e.messages))
+        finally:
+            if rejected_file is not None:
+                rejected_file.close()
+
+        action = "validated" if options["dry_run"] else "imported"
+        self.stdout.write(
+            self.style.SUCCESS(f"{created} grades {action}, {rejected} rows rejected")
+        )
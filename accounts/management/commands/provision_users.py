@@ -0,0 +1,100 @@
+import csv
+
+from django import forms
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.services import PROVISION_ROW_FIELDS, provision_users_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "create students, parents and their links from a csv file with the "
+        "columns student,student_password,first_name,last_name,grade and the "
+        "optional parent,parent_password,parent_first_name,parent_last_name "
+        "(one row per child, a parent with several children repeats its "
+        "username). existing usernames are reused so the file can be rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="path of the csv file")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="number of rows validated and inserted per transaction",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="number of processes hashing passwords (default: one per cpu)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="validate the file without creating any user",
+        )
+        parser.add_argument(
+            "--rejected",
+            help="write rejected rows with their error to this csv file",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be a positive number")
+        if options["workers"] is not None and options["workers"] < 1:
+            raise CommandError("--workers must be a positive number")
+
+        rejected_file = writer = None
+        if options["rejected"]:
+            rejected_file = open(
+                options["rejected"], "w", newline="", encoding="utf-8-sig"
+            )
+            writer = csv.writer(rejected_file)
+            writer.writerow(("row", *PROVISION_ROW_FIELDS, "error"))
+
+        students = parents = links = existing = rejected = 0
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as f:
+                reports = provision_users_csv(
+                    f,
+                    workers=options["workers"],
+                    chunk_size=options["chunk_size"],
+                    dry_run=options["dry_run"],
+                )
+                for report in reports:
+                    students += report.students
+                    parents += report.parents
+                    links += report.links
+                    existing += report.existing
+                    rejected += report.error_count
+                    for error in report.errors:
+                        if writer is not None:
+                            writer.writerow(
+                                (
+                                    error.row,
+                                    *(
+                                        error.data.get(name)
+                                        for name in PROVISION_ROW_FIELDS
+                                    ),
+                                    error.message,
+                                )
+                            )
+                        else:
+                            self.stderr.write(str(error))
+        except OSError as e:
+            raise CommandError(str(e))
+        except forms.ValidationError as e:
+            raise CommandError(" ".join(e.messages))
+        finally:
+            if rejected_file is not None:
+                rejected_file.close()
+
+        action = "validated" if options["dry_run"] else "created"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{students} students and {parents} parents {action}, "
+                f"{links} parent links added, {existing} existing students "
+                f"skipped, {rejected} rows rejected"
+            )
+        )
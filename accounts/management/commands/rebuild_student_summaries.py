@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Student, StudentSummary
+
+
+class Command(BaseCommand):
+    help = "recompute the StudentSummary row of every student"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="number of students recomputed per query",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be a positive number")
+
+        student_ids = list(Student.objects.order_by("id").values_list("id", flat=True))
+        for start in range(0, len(student_ids), chunk_size):
+            StudentSummary.objects.refresh(student_ids[start : start + chunk_size])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{len(student_ids)} student summaries rebuilt")
+        )
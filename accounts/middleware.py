@@ -0,0 +1,28 @@
+from django.utils.functional import SimpleLazyObject
+
+
+def _role_profile(request):
+    user = request.user
+    return user.get_role_profile() if user.is_authenticated else None
+
+
+class RoleProfileMiddleware:
+    """expose the profile of the logged in user's role as request.role_profile"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.role_profile = SimpleLazyObject(lambda: _role_profile(request))
+        return self.get_response(request)
+
+
+def get_role_profile(request, model):
+    """
+    request.role_profile when it is a `model` instance, otherwise raise
+    model.DoesNotExist just like model.objects.get(user=request.user) would.
+    """
+    profile = getattr(request, "role_profile", None)
+    if not isinstance(profile, model):
+        raise model.DoesNotExist()
+    return profile
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:16
+
+import django.db.models.deletion
+import django_jalali.db.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StudentSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "lesson_count",
+                    models.PositiveIntegerField(default=0, verbose_name="تعداد دروس"),
+                ),
+                (
+                    "great_count",
+                    models.PositiveIntegerField(default=0, verbose_name="نمره عالی"),
+                ),
+                (
+                    "good_count",
+                    models.PositiveIntegerField(default=0, verbose_name="نمره خوب"),
+                ),
+                (
+                    "average_count",
+                    models.PositiveIntegerField(default=0, verbose_name="نمره متوسط"),
+                ),
+                (
+                    "present_count",
+                    models.PositiveIntegerField(default=0, verbose_name="حاضر"),
+                ),
+                (
+                    "absent_count",
+                    models.PositiveIntegerField(default=0, verbose_name="غایب"),
+                ),
+                (
+                    "late_count",
+                    models.PositiveIntegerField(default=0, verbose_name="تاخیر"),
+                ),
+                (
+                    "average_score",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="میانگین نمرات"
+                    ),
+                ),
+                (
+                    "updated_date",
+                    django_jalali.db.models.jDateTimeField(
+                        auto_now=True, verbose_name="بروزرسانی"
+                    ),
+                ),
+                (
+                    "student",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="summary",
+                        to="accounts.student",
+                        verbose_name="دانش آموز",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "خلاصه وضعیت دانش آموز",
+                "verbose_name_plural": "خلاصه وضعیت دانش آموزان",
+            },
+        ),
+    ]
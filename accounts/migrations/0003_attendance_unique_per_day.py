@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:18
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_attendance(apps, schema_editor):
+    # فقط آخرین رکورد هر دانش آموز در هر درس و روز نگه داشته می‌شود
+    AttendanceRecord = apps.get_model("accounts", "AttendanceRecord")
+    keep = (
+        AttendanceRecord.objects.values("student", "lesson", "created_date")
+        .order_by()
+        .annotate(last_id=Max("id"))
+        .values_list("last_id", flat=True)
+    )
+    AttendanceRecord.objects.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_studentsummary"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_attendance, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="attendancerecord",
+            constraint=models.UniqueConstraint(
+                fields=("student", "lesson", "created_date"),
+                name="unique_attendance_per_day",
+            ),
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:19
+
+import django.db.models.deletion
+import django_jalali.db.models
+from django.db import migrations, models
+
+
+def create_sessions(apps, schema_editor):
+    # رکوردهای قبلی هر درس در هر روز به زنگ اول همان روز منتقل می‌شوند
+    AttendanceRecord = apps.get_model("accounts", "AttendanceRecord")
+    ClassSession = apps.get_model("accounts", "ClassSession")
+    days = (
+        AttendanceRecord.objects.order_by()
+        .values_list("lesson_id", "created_date")
+        .distinct()
+    )
+    for lesson_id, date in days:
+        session = ClassSession.objects.create(lesson_id=lesson_id, date=date, period=1)
+        AttendanceRecord.objects.filter(lesson_id=lesson_id, created_date=date).update(
+            session=session
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_attendance_unique_per_day"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ClassSession",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", django_jalali.db.models.jDateField(verbose_name="تاریخ")),
+                (
+                    "period",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (1, "زنگ اول"),
+                            (2, "زنگ دوم"),
+                            (3, "زنگ سوم"),
+                            (4, "زنگ چهارم"),
+                            (5, "زنگ پنجم"),
+                            (6, "زنگ ششم"),
+                        ],
+                        default=1,
+                        verbose_name="زنگ",
+                    ),
+                ),
+                (
+                    "created_date",
+                    django_jalali.db.models.jDateTimeField(
+                        auto_now_add=True, verbose_name="زمان ثبت"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "جلسه کلاس",
+                "verbose_name_plural": "جلسه های کلاس",
+                "ordering": ("-date", "-period"),
+            },
+        ),
+        migrations.RemoveConstraint(
+            model_name="attendancerecord",
+            name="unique_attendance_per_day",
+        ),
+        migrations.AddField(
+            model_name="classsession",
+            name="lesson",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="sessions",
+                to="accounts.lesson",
+                verbose_name="درس",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="classsession",
+            constraint=models.UniqueConstraint(
+                fields=("lesson", "date", "period"), name="unique_class_session"
+            ),
+        ),
+        migrations.AddField(
+            model_name="attendancerecord",
+            name="session",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="attendancerecords",
+                to="accounts.classsession",
+                verbose_name="جلسه",
+            ),
+        ),
+        migrations.RunPython(create_sessions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="attendancerecord",
+            name="session",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="attendancerecords",
+                to="accounts.classsession",
+                verbose_name="جلسه",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="attendancerecord",
+            constraint=models.UniqueConstraint(
+                fields=("session", "student"), name="unique_session_attendance"
+            ),
+        ),
+    ]
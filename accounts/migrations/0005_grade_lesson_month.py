@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_classsession"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="grade",
+            index=models.Index(fields=["lesson", "month"], name="grade_lesson_month"),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:44
+
+from django.db import migrations, models
+
+
+def mark_existing_messages_read(apps, schema_editor):
+    # پیام های قبلی در پنل معلم دیده شده اند و شمارنده از صفر شروع می شود
+    TeacherContact = apps.get_model("accounts", "TeacherContact")
+    TeacherContact.objects.update(is_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0005_grade_lesson_month"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="teacher",
+            name="unread_messages",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="پیام های خوانده نشده"
+            ),
+        ),
+        migrations.AddField(
+            model_name="teachercontact",
+            name="is_read",
+            field=models.BooleanField(default=False, verbose_name="خوانده شده"),
+        ),
+        migrations.RunPython(mark_existing_messages_read, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="teachercontact",
+            index=models.Index(
+                fields=["teacher", "is_read", "-id"], name="teachercontact_inbox"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0006_teacher_inbox"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(fields=["show", "-id"], name="comment_wall"),
+        ),
+    ]
@@ -1,13 +1,26 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Avg, Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import (
     BaseUserManager,
     AbstractBaseUser,
     PermissionsMixin,
 )
 from django.utils.translation import gettext_lazy as _
-from django.db.models.signals import post_save
+from django.utils import timezone
+from django.core.cache import cache
+from django.db.models.signals import (
+    post_save,
+    post_delete,
+    pre_delete,
+    pre_save,
+    m2m_changed,
+)
 from django.dispatch import receiver
 from django_jalali.db import models as jmodels
+import jdatetime
+import time
+from collections import Counter
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
@@ -66,6 +79,29 @@ class User(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.username
 
+    def get_role_profile(self):
+        """
+        the single profile row of the user's role, following the same order
+        of role flags as base.html. returns None when it was never created.
+        """
+        if self.is_superuser:
+            name = "profiles"
+        elif self.is_teacher:
+            name = "teachers"
+        elif self.is_student:
+            name = "students"
+        elif self.is_parents:
+            name = "parents"
+        elif self.is_user:
+            name = "newusers"
+        else:
+            return None
+        return getattr(self, name, None)
+
+
+# related names of every role profile, see User.get_role_profile
+ROLE_PROFILE_FIELDS = ("profiles", "teachers", "students", "parents", "newusers")
+
 
 class ProfileAdmin(models.Model):
     user = models.OneToOneField(
@@ -120,18 +156,71 @@ class Teacher(models.Model):
     degree = models.CharField(max_length=250, verbose_name="مدرک")
     teaching_experience = models.IntegerField(default=0, verbose_name="سابقه دریس")
     status = models.BooleanField(default=False, verbose_name="نمره گذاشتن")
+    # فقط با update و F تغییر می کند، به TeacherContact نگاه کنید
+    unread_messages = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="پیام های خوانده نشده"
+    )
     created_date = jmodels.jDateField(auto_now_add=True, verbose_name="زمان ثبت")
     updated_date = jmodels.jDateField(auto_now=True, verbose_name="زمان اپدیت")
 
     def __str__(self):
         return self.full_name
 
+    def save(self, *args, **kwargs):
+        # نسخه قدیمی شمارنده که در حافظه مانده نباید روی مقدار جدید نوشته شود
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "unread_messages"
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ("-id",)
         verbose_name = "معلم"
         verbose_name_plural = "معلم ها"
 
 
+def add_unread_messages(changes):
+    for teacher_id, delta in changes.items():
+        if delta:
+            Teacher.objects.filter(pk=teacher_id).update(
+                unread_messages=F("unread_messages") + delta
+            )
+
+
+def recount_unread_messages(teacher_ids):
+    Teacher.objects.filter(id__in=teacher_ids).update(
+        unread_messages=Coalesce(
+            Subquery(
+                TeacherContact.objects.filter(teacher=OuterRef("pk"), is_read=False)
+                .order_by()
+                .values("teacher")
+                .annotate(count=Count("*"))
+                .values("count")
+            ),
+            0,
+        )
+    )
+
+
+class TeacherContactManager(models.Manager):
+    def mark_read(self, teacher, ids):
+        """
+        mark the given messages of a teacher as read and lower its unread
+        counter in the same transaction. returns how many were unread.
+        """
+        with transaction.atomic():
+            count = self.filter(teacher=teacher, id__in=ids, is_read=False).update(
+                is_read=True
+            )
+            add_unread_messages({teacher.pk: -count})
+        if count:
+            bump_teacher_panel([teacher.pk])
+        return count
+
+
 class TeacherContact(models.Model):
     teacher = models.ForeignKey(
         Teacher,
@@ -148,17 +237,42 @@ class TeacherContact(models.Model):
     student_name = models.CharField(max_length=250, verbose_name="نام دانش اموز")
     subject = models.CharField(max_length=250, verbose_name="موضوع پیام")
     message = models.TextField(verbose_name="متن پیام")
+    is_read = models.BooleanField(default=False, verbose_name="خوانده شده")
 
     created_date = jmodels.jDateField(auto_now_add=True)
 
+    objects = TeacherContactManager()
+
     class Meta:
         ordering = ("-id",)
         verbose_name = "پیام معلم"
         verbose_name_plural = "پیام های معلم"
+        indexes = [
+            models.Index(
+                fields=["teacher", "is_read", "-id"], name="teachercontact_inbox"
+            )
+        ]
 
     def __str__(self):
         return self.teacher.full_name
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = (
+                    TeacherContact.objects.filter(pk=self.pk)
+                    .values_list("teacher_id", "is_read")
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            changes = Counter()
+            if previous and not previous[1]:
+                changes[previous[0]] -= 1
+            if not self.is_read:
+                changes[self.teacher_id] += 1
+            add_unread_messages(changes)
+
 
 class Parents(models.Model):
     user = models.OneToOneField(
@@ -261,6 +375,7 @@ class Comment(models.Model):
         ordering = ("-id",)
         verbose_name = "نظر"
         verbose_name_plural = "نظرات"
+        indexes = [models.Index(fields=["show", "-id"], name="comment_wall")]
 
     def __str__(self):
         return self.full_name
@@ -329,11 +444,62 @@ class Grade(models.Model):
         ordering = ("-month",)
         verbose_name = "نمره"
         verbose_name_plural = "نمره ها"
+        indexes = [models.Index(fields=["lesson", "month"], name="grade_lesson_month")]
 
     def __str__(self):
         return f"{self.student} {self.lesson} {self.score}"
 
 
+def school_today():
+    return jdatetime.date.fromgregorian(date=timezone.localdate())
+
+
+# ماه های سال تحصیلی از مهر تا خرداد
+SCHOOL_MONTHS = list(Grade.months)[3:] + list(Grade.months)[:3]
+
+
+class ClassSessionManager(models.Manager):
+    def today(self, lesson, period=1):
+        session, _ = self.get_or_create(
+            lesson=lesson, date=school_today(), period=period
+        )
+        return session
+
+
+class ClassSession(models.Model):
+    periods = {
+        1: "زنگ اول",
+        2: "زنگ دوم",
+        3: "زنگ سوم",
+        4: "زنگ چهارم",
+        5: "زنگ پنجم",
+        6: "زنگ ششم",
+    }
+    lesson = models.ForeignKey(
+        Lesson, on_delete=models.CASCADE, related_name="sessions", verbose_name="درس"
+    )
+    date = jmodels.jDateField(verbose_name="تاریخ")
+    period = models.PositiveSmallIntegerField(
+        choices=periods, default=1, verbose_name="زنگ"
+    )
+    created_date = jmodels.jDateTimeField(auto_now_add=True, verbose_name="زمان ثبت")
+
+    objects = ClassSessionManager()
+
+    class Meta:
+        ordering = ("-date", "-period")
+        verbose_name = "جلسه کلاس"
+        verbose_name_plural = "جلسه های کلاس"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["lesson", "date", "period"], name="unique_class_session"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.lesson} {self.date} {self.get_period_display()}"
+
+
 class AttendanceRecord(models.Model):
     sta = {"present": "حاضر", "absent": "غایب", "late": "تاخیر"}
     student = models.ForeignKey(
@@ -348,6 +514,12 @@ class AttendanceRecord(models.Model):
         related_name="attendancerecords",
         verbose_name="درس",
     )
+    session = models.ForeignKey(
+        ClassSession,
+        on_delete=models.CASCADE,
+        related_name="attendancerecords",
+        verbose_name="جلسه",
+    )
     status = models.CharField(
         max_length=20,
         verbose_name="وضعیت",
@@ -361,6 +533,265 @@ class AttendanceRecord(models.Model):
         ordering = ("-id",)
         verbose_name = "حضور و غیاب"
         verbose_name_plural = "حضور و غیاب ها"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["session", "student"], name="unique_session_attendance"
+            )
+        ]
 
     def __str__(self):
         return self.student.first_name
+
+
+class StudentSummaryManager(models.Manager):
+    def refresh(self, student_ids):
+        """
+        recompute the summary rows of the given students from their grades,
+        attendance records and lessons and upsert them in one statement.
+        """
+        student_ids = set(
+            Student.objects.filter(id__in=student_ids).values_list("id", flat=True)
+        )
+        if not student_ids:
+            return
+
+        summaries = {pk: self.model(student_id=pk) for pk in student_ids}
+        grades = (
+            Grade.objects.filter(student_id__in=student_ids)
+            .values("student_id")
+            .annotate(
+                great_count=Count("id", filter=Q(status="great")),
+                good_count=Count("id", filter=Q(status="good")),
+                average_count=Count("id", filter=Q(status="average")),
+                average_score=Avg("score"),
+            )
+        )
+        attendance = (
+            AttendanceRecord.objects.filter(student_id__in=student_ids)
+            .values("student_id")
+            .annotate(
+                present_count=Count("id", filter=Q(status="present")),
+                absent_count=Count("id", filter=Q(status="absent")),
+                late_count=Count("id", filter=Q(status="late")),
+            )
+        )
+        lessons = (
+            Lesson.student.through.objects.filter(student_id__in=student_ids)
+            .values("student_id")
+            .annotate(lesson_count=Count("id"))
+        )
+        for rows in (grades, attendance, lessons):
+            for row in rows:
+                summary = summaries[row.pop("student_id")]
+                for name, value in row.items():
+                    setattr(summary, name, value)
+
+        self.bulk_create(
+            summaries.values(),
+            update_conflicts=True,
+            unique_fields=["student"],
+            update_fields=StudentSummary.COUNTER_FIELDS + ("updated_date",),
+        )
+
+
+class StudentSummary(models.Model):
+    COUNTER_FIELDS = (
+        "lesson_count",
+        "great_count",
+        "good_count",
+        "average_count",
+        "present_count",
+        "absent_count",
+        "late_count",
+        "average_score",
+    )
+
+    student = models.OneToOneField(
+        Student,
+        on_delete=models.CASCADE,
+        related_name="summary",
+        verbose_name="دانش آموز",
+    )
+    lesson_count = models.PositiveIntegerField(default=0, verbose_name="تعداد دروس")
+    great_count = models.PositiveIntegerField(default=0, verbose_name="نمره عالی")
+    good_count = models.PositiveIntegerField(default=0, verbose_name="نمره خوب")
+    average_count = models.PositiveIntegerField(default=0, verbose_name="نمره متوسط")
+    present_count = models.PositiveIntegerField(default=0, verbose_name="حاضر")
+    absent_count = models.PositiveIntegerField(default=0, verbose_name="غایب")
+    late_count = models.PositiveIntegerField(default=0, verbose_name="تاخیر")
+    average_score = models.FloatField(
+        null=True, blank=True, verbose_name="میانگین نمرات"
+    )
+    updated_date = jmodels.jDateTimeField(auto_now=True, verbose_name="بروزرسانی")
+
+    objects = StudentSummaryManager()
+
+    class Meta:
+        verbose_name = "خلاصه وضعیت دانش آموز"
+        verbose_name_plural = "خلاصه وضعیت دانش آموزان"
+
+    def __str__(self):
+        return str(self.student)
+
+    def grade_count(self, status):
+        return getattr(self, f"{status}_count", 0) if status in Grade.status_dict else 0
+
+    def attendance_count(self, status):
+        return (
+            getattr(self, f"{status}_count", 0) if status in AttendanceRecord.sta else 0
+        )
+
+
+def refresh_student_summaries(student_ids):
+    student_ids = set(student_ids)
+    transaction.on_commit(lambda: StudentSummary.objects.refresh(student_ids))
+
+
+@receiver([post_save, post_delete], sender=Grade)
+@receiver([post_save, post_delete], sender=AttendanceRecord)
+def update_student_summary(sender, instance, **kwargs):
+    refresh_student_summaries([instance.student_id])
+
+
+@receiver(m2m_changed, sender=Lesson.student.through)
+def update_student_lesson_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        instance._summary_student_ids = (
+            [instance.pk]
+            if reverse
+            else list(instance.student.values_list("id", flat=True))
+        )
+    elif action == "post_clear":
+        refresh_student_summaries(instance.__dict__.pop("_summary_student_ids", []))
+    elif action in ("post_add", "post_remove"):
+        refresh_student_summaries([instance.pk] if reverse else pk_set)
+
+
+@receiver(pre_delete, sender=Lesson)
+def collect_lesson_students(sender, instance, **kwargs):
+    instance._summary_student_ids = list(instance.student.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=Lesson)
+def update_lesson_students_summary(sender, instance, **kwargs):
+    refresh_student_summaries(instance.__dict__.pop("_summary_student_ids", []))
+
+
+def grade_rank_key(lesson_id, month):
+    return f"grade-ranks:{lesson_id}:{month}"
+
+
+def invalidate_grade_ranks(partitions):
+    # بعد از commit پاک می شود تا درخواست همزمان رتبه قدیمی را دوباره ذخیره نکند
+    keys = [grade_rank_key(lesson_id, month) for lesson_id, month in set(partitions)]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def cache_version(key):
+    version = cache.get(key)
+    if version is None:
+        # نسخه جدید نباید با نسخه ای که قبلا از کش حذف شده یکی شود
+        version = time.time_ns()
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump_cache_versions(keys):
+    def bump():
+        for key in keys:
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), None)
+
+    keys = set(keys)
+    transaction.on_commit(bump)
+
+
+def grade_distribution_version(lesson_id):
+    return cache_version(f"grade-distribution-version:{lesson_id}")
+
+
+def bump_grade_distribution(lesson_ids):
+    bump_cache_versions(
+        f"grade-distribution-version:{lesson_id}" for lesson_id in lesson_ids
+    )
+
+
+@receiver([post_save, post_delete], sender=Grade)
+def update_grade_caches(sender, instance, **kwargs):
+    invalidate_grade_ranks([(instance.lesson_id, instance.month)])
+    bump_grade_distribution([instance.lesson_id])
+
+
+def teacher_panel_version(teacher_id):
+    return cache_version(f"teacher-panel-version:{teacher_id}")
+
+
+def bump_teacher_panel(teacher_ids):
+    bump_cache_versions(
+        f"teacher-panel-version:{teacher_id}" for teacher_id in teacher_ids
+    )
+
+
+@receiver(m2m_changed, sender=Lesson.student.through)
+def update_teacher_panel_roster(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("pre_clear", "post_add", "post_remove"):
+        return
+    if not reverse:
+        bump_teacher_panel([instance.teacher_id])
+    elif action == "pre_clear":
+        bump_teacher_panel(instance.lessons.values_list("teacher_id", flat=True))
+    else:
+        bump_teacher_panel(
+            Lesson.objects.filter(id__in=pk_set).values_list("teacher_id", flat=True)
+        )
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+@receiver([post_save, post_delete], sender=TeacherContact)
+def update_teacher_panel(sender, instance, **kwargs):
+    bump_teacher_panel([instance.teacher_id])
+
+
+@receiver(post_delete, sender=TeacherContact)
+def update_unread_messages(sender, instance, **kwargs):
+    # نمونه حذف شده ممکن است کهنه باشد، پس شمارنده از روی ایندکس دوباره شمرده
+    # می شود. حذف در تراکنش Collector است و شمارنده هم با آن ثبت می شود
+    recount_unread_messages([instance.teacher_id])
+
+
+@receiver(post_save, sender=Student)
+def update_teacher_panel_student(sender, instance, created, **kwargs):
+    if not created:
+        bump_teacher_panel(
+            Lesson.objects.filter(student=instance).values_list("teacher_id", flat=True)
+        )
+
+
+@receiver([post_save, post_delete], sender="blog.Article")
+def update_teacher_panel_articles(sender, instance, **kwargs):
+    bump_teacher_panel(
+        Teacher.objects.filter(user_id=instance.author_id).values_list("id", flat=True)
+    )
+
+
+def comment_wall_version():
+    return cache_version("comment-wall-version")
+
+
+@receiver(pre_save, sender=Comment)
+def collect_comment_show(sender, instance, **kwargs):
+    instance._wall_was_shown = (
+        instance.pk is not None
+        and Comment.objects.filter(pk=instance.pk, show=True).exists()
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def update_comment_wall(sender, instance, **kwargs):
+    # نظرهای تازه والدین تا تایید نشوند روی دیوار نمی آیند و کش را خراب نمی کنند
+    if instance.show or instance.__dict__.pop("_wall_was_shown", False):
+        bump_cache_versions(["comment-wall-version"])
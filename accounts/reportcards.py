@@ -0,0 +1,230 @@
+import importlib.util
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Max
+from django.template.loader import render_to_string
+
+from .models import (
+    AttendanceRecord,
+    Grade,
+    Lesson,
+    Student,
+    school_today,
+    SCHOOL_MONTHS,
+)
+
+
+REPORT_CARD_TEMPLATE = "accounts/report_card.html"
+
+
+def report_card_root():
+    return getattr(
+        settings,
+        "REPORT_CARD_ROOT",
+        os.path.join(settings.BASE_DIR, "report_cards"),
+    )
+
+
+def card_path(student_id, key, extension="html"):
+    return os.path.join(report_card_root(), str(student_id), f"{key}.{extension}")
+
+
+def pdf_available():
+    return importlib.util.find_spec("weasyprint") is not None
+
+
+@dataclass
+class ReportCardRun:
+    rendered: list = field(default_factory=list)
+    cached: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)
+
+
+def card_keys(student_ids):
+    """
+    cache key of every student's card in one query: the latest grade
+    updated_date plus the summary stamp, which moves on any grade or
+    attendance change (updated_date alone only has a one day resolution).
+    """
+    rows = (
+        Student.objects.filter(id__in=student_ids)
+        .order_by()
+        .annotate(latest_grade=Max("grades__updated_date"))
+        .values_list("id", "latest_grade", "summary__updated_date")
+    )
+    keys = {}
+    for student_id, latest_grade, summary_date in rows:
+        latest_grade = latest_grade.strftime("%Y%m%d") if latest_grade else "0"
+        summary_date = summary_date.strftime("%Y%m%d%H%M%S") if summary_date else "0"
+        keys[student_id] = f"{latest_grade}-{summary_date}"
+    return keys
+
+
+def load_report_data(student_ids):
+    """
+    everything the cards of `student_ids` show, loaded with a fixed number of
+    queries for the whole batch and returned as plain picklable dicts so the
+    rendering can happen in worker processes without touching the database.
+    """
+    students = Student.objects.filter(id__in=student_ids).select_related("user")
+    enrolments = (
+        Lesson.student.through.objects.filter(student_id__in=student_ids)
+        .select_related("lesson__teacher")
+        .order_by("lesson__name")
+    )
+    grades = (
+        Grade.objects.filter(student_id__in=student_ids)
+        .order_by("id")
+        .values_list("student_id", "lesson_id", "month", "score", "class_activity")
+    )
+    attendance = (
+        AttendanceRecord.objects.filter(student_id__in=student_ids)
+        .order_by()
+        .values_list("student_id", "lesson_id", "status")
+        .annotate(count=Count("id"))
+    )
+
+    scores = defaultdict(dict)
+    for student_id, lesson_id, month, score, class_activity in grades:
+        scores[student_id, lesson_id][month] = (score, class_activity)
+    records = defaultdict(dict)
+    for student_id, lesson_id, status, count in attendance:
+        records[student_id, lesson_id][status] = count
+
+    lessons = defaultdict(list)
+    for enrolment in enrolments:
+        lesson = enrolment.lesson
+        key = (enrolment.student_id, lesson.id)
+        monthly = scores.get(key, {})
+        values = [score for score, class_activity in monthly.values()]
+        lessons[enrolment.student_id].append(
+            {
+                "name": lesson.name,
+                "teacher": lesson.teacher.full_name,
+                "months": [monthly.get(month) for month in SCHOOL_MONTHS],
+                "average": round(sum(values) / len(values), 2) if values else None,
+                "present": records[key].get("present", 0),
+                "absent": records[key].get("absent", 0),
+                "late": records[key].get("late", 0),
+            }
+        )
+
+    today = school_today().strftime("%Y/%m/%d")
+    data = {}
+    for student in students:
+        rows = lessons.get(student.id, [])
+        averages = [row["average"] for row in rows if row["average"] is not None]
+        data[student.id] = {
+            "student": {
+                "id": student.id,
+                "username": student.user.username,
+                "first_name": student.first_name,
+                "last_name": student.last_name,
+                "grade": student.get_grade_display(),
+            },
+            "months": SCHOOL_MONTHS,
+            "lessons": rows,
+            "average": (round(sum(averages) / len(averages), 2) if averages else None),
+            "absent": sum(row["absent"] for row in rows),
+            "late": sum(row["late"] for row in rows),
+            "date": today,
+        }
+    return data
+
+
+def render_card(context, key, pdf=False):
+    """
+    render one card to disk and drop the older files of the same student.
+    runs inside the worker processes so it must not query the database.
+    """
+    student_id = context["student"]["id"]
+    html = render_to_string(REPORT_CARD_TEMPLATE, context)
+    path = card_path(student_id, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_atomic(path, html.encode("utf-8"))
+    if pdf:
+        from weasyprint import HTML
+
+        _write_atomic(card_path(student_id, key, "pdf"), HTML(string=html).write_pdf())
+
+    keep = {os.path.basename(path), os.path.basename(card_path(student_id, key, "pdf"))}
+    for name in os.listdir(os.path.dirname(path)):
+        if name not in keep and not name.endswith(".tmp"):
+            os.remove(os.path.join(os.path.dirname(path), name))
+    return student_id
+
+
+def _write_atomic(path, content):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _init_worker():
+    django.setup()
+
+
+def _stale(keys, pdf, force):
+    extension = "pdf" if pdf else "html"
+    return {
+        student_id: key
+        for student_id, key in keys.items()
+        if force or not os.path.exists(card_path(student_id, key, extension))
+    }
+
+
+def generate_report_cards(
+    students, pdf=False, workers=None, batch_size=200, force=False
+):
+    """
+    render the cards of every student in `students` across a process pool.
+    each batch is loaded with a handful of bulk queries in this process and
+    only cards whose cache key changed since the last run are rendered.
+    """
+    student_ids = list(students.order_by("id").values_list("id", flat=True))
+    run = ReportCardRun()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for offset in range(0, len(student_ids), batch_size):
+            batch = student_ids[offset : offset + batch_size]
+            keys = card_keys(batch)
+            stale = _stale(keys, pdf, force)
+            run.cached.extend(set(keys) - set(stale))
+            if not stale:
+                continue
+
+            data = load_report_data(list(stale))
+            # workers are forked on the first submit and must not inherit
+            # this process's open database connections
+            connections.close_all()
+            futures = {
+                pool.submit(render_card, data[student_id], key, pdf): student_id
+                for student_id, key in stale.items()
+                if student_id in data
+            }
+            for future in as_completed(futures):
+                student_id = futures[future]
+                try:
+                    run.rendered.append(future.result())
+                except Exception as e:
+                    run.failed[student_id] = str(e)
+    return run
+
+
+def get_report_card(student, pdf=False):
+    """
+    path of the up to date card of one student, rendered in this process
+    when the cached file is missing or stale.
+    """
+    key = card_keys([student.id])[student.id]
+    path = card_path(student.id, key, "pdf" if pdf else "html")
+    if not os.path.exists(path):
+        render_card(load_report_data([student.id])[student.id], key, pdf=pdf)
+    return path
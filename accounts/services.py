@@ -0,0 +1,684 @@
+import contextlib
+import csv
+import json
+import math
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+
+import django
+
+from django import forms
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, F, Window
+from django.db.models.functions import CumeDist, Rank
+
+from .forms import validate_score, validate_class_activity
+from .usernames import username_index
+from .models import (
+    Grade,
+    Lesson,
+    Parents,
+    Student,
+    User,
+    StudentSummary,
+    grade_rank_key,
+    invalidate_grade_ranks,
+    bump_grade_distribution,
+)
+
+
+GRADE_ROW_FIELDS = ("student", "lesson", "month", "score", "class_activity", "status")
+
+
+@dataclass
+class GradeRowError:
+    row: int
+    student: str
+    message: str
+    data: dict = field(default_factory=dict)
+
+    def __str__(self):
+        return f"ردیف {self.row} ({self.student or '-'}): {self.message}"
+
+
+@dataclass
+class GradeImportReport:
+    created: int = 0
+    errors: list = field(default_factory=list)
+
+    @property
+    def error_count(self):
+        return len(self.errors)
+
+
+def _to_float(value, message):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise forms.ValidationError(message)
+    # float() also accepts "nan" and "inf"
+    if not math.isfinite(value):
+        raise forms.ValidationError(message)
+    return value
+
+
+def _build_grade(row, students, lessons, enrolled):
+    if not all(str(row.get(name) or "").strip() for name in GRADE_ROW_FIELDS):
+        raise forms.ValidationError("تمامی قسمت ها باید به درستی پر شوند.")
+
+    student_id = students.get(str(row["student"]).strip())
+    if student_id is None:
+        raise forms.ValidationError("دانش آموزی با این نام کاربری وجود ندارد.")
+
+    lesson_ids = lessons.get(str(row["lesson"]).strip())
+    if not lesson_ids:
+        raise forms.ValidationError("درس مورد نظر یافت نشد.")
+    # lesson names repeat across grade levels, a name must not pick one of
+    # them at random
+    if len(lesson_ids) > 1:
+        raise forms.ValidationError("چند درس با این نام وجود دارد.")
+    lesson_id = lesson_ids[0]
+    if (lesson_id, student_id) not in enrolled:
+        raise forms.ValidationError("دانش آموز در این درس ثبت نام نشده است.")
+
+    score = _to_float(row["score"], "نمره باید عدد باشد.")
+    validate_score(score)
+    class_activity = _to_float(row["class_activity"], "نمره کلاسی باید عدد باشد.")
+    validate_class_activity(class_activity)
+
+    month = str(row["month"]).strip()
+    if month not in Grade.months:
+        raise forms.ValidationError("ماه انتخاب شده معتبر نیست.")
+    status = str(row["status"]).strip()
+    if status not in Grade.status_dict:
+        raise forms.ValidationError("وضعیت انتخاب شده معتبر نیست.")
+
+    return Grade(
+        student_id=student_id,
+        lesson_id=lesson_id,
+        score=score,
+        class_activity=class_activity,
+        month=month,
+        status=status,
+    )
+
+
+def ingest_grades(
+    rows, teacher=None, lesson_field="name", dry_run=False, batch_size=500, start=1
+):
+    """
+    validate a batch of grade rows in memory and insert the valid ones with
+    one bulk_create. students and lessons are resolved with one query each
+    instead of one per row. lessons are matched on `lesson_field` (name or id)
+    and restricted to `teacher` when given. a name shared by several lessons
+    and a student not enrolled in the lesson are row errors.
+    """
+    rows = list(rows)
+    report = GradeImportReport()
+
+    usernames = {str(row.get("student") or "").strip() for row in rows}
+    lesson_keys = {str(row.get("lesson") or "").strip() for row in rows}
+    usernames.discard("")
+    lesson_keys.discard("")
+
+    students = dict(
+        Student.objects.filter(user__username__in=usernames).values_list(
+            "user__username", "id"
+        )
+    )
+    if lesson_field == "id":
+        lesson_keys = {key for key in lesson_keys if key.isdigit()}
+    lessons = Lesson.objects.filter(**{f"{lesson_field}__in": lesson_keys})
+    if teacher is not None:
+        lessons = lessons.filter(teacher=teacher)
+    lesson_ids = defaultdict(list)
+    for key, pk in lessons.values_list(lesson_field, "id"):
+        lesson_ids[str(key)].append(pk)
+    enrolled = set(
+        Lesson.student.through.objects.filter(
+            lesson_id__in=[pk for pks in lesson_ids.values() for pk in pks],
+            student_id__in=students.values(),
+        ).values_list("lesson_id", "student_id")
+    )
+
+    grades = []
+    for index, row in enumerate(rows, start=start):
+        try:
+            grades.append(_build_grade(row, students, lesson_ids, enrolled))
+        except forms.ValidationError as e:
+            report.errors.append(
+                GradeRowError(
+                    row=index,
+                    student=str(row.get("student") or ""),
+                    message=" ".join(e.messages),
+                    data=row,
+                )
+            )
+
+    if grades and not dry_run:
+        with transaction.atomic():
+            Grade.objects.bulk_create(grades, batch_size=batch_size)
+            # bulk_create skips the post_save hooks that keep summaries fresh
+            StudentSummary.objects.refresh({grade.student_id for grade in grades})
+            invalidate_grade_ranks((grade.lesson_id, grade.month) for grade in grades)
+            bump_grade_distribution(grade.lesson_id for grade in grades)
+    report.created = len(grades)
+    return report
+
+
+def import_grades_csv(fileobj, teacher=None, chunk_size=1000, dry_run=False):
+    """
+    stream a gradebook csv (student, lesson, month, score, class_activity,
+    status with lesson given by id) into ingest_grades in fixed-size chunks.
+    yields one report per chunk so callers never hold the whole file.
+    """
+    reader = csv.DictReader(fileobj)
+    missing = set(GRADE_ROW_FIELDS) - set(reader.fieldnames or ())
+    if missing:
+        raise forms.ValidationError(
+            f"ستون های {', '.join(sorted(missing))} در فایل وجود ندارند."
+        )
+
+    start = 1
+    while chunk := list(islice(reader, chunk_size)):
+        yield ingest_grades(
+            chunk, teacher=teacher, lesson_field="id", dry_run=dry_run, start=start
+        )
+        start += len(chunk)
+
+
+GRADE_EXPORT_FIELDS = (
+    "id",
+    "student",
+    "student_name",
+    "student_grade",
+    "lesson",
+    "lesson_name",
+    "month",
+    "score",
+    "class_activity",
+    "status",
+    "updated_date",
+)
+
+
+class _Echo:
+    """file-like object whose write() hands the formatted csv line back"""
+
+    def write(self, value):
+        return value
+
+
+def iter_grade_export_rows(grades, chunk_size=2000):
+    grades = grades.select_related("student__user", "lesson").order_by(
+        "lesson_id", "student_id", "id"
+    )
+    for grade in grades.iterator(chunk_size=chunk_size):
+        student = grade.student
+        yield (
+            grade.id,
+            student.user.username,
+            f"{student.first_name} {student.last_name}",
+            student.grade,
+            grade.lesson_id,
+            grade.lesson.name,
+            grade.month,
+            grade.score,
+            grade.class_activity,
+            grade.status,
+            str(grade.updated_date),
+        )
+
+
+def _batched(lines, size=500):
+    while batch := "".join(islice(lines, size)):
+        yield batch
+
+
+def stream_grades_csv(grades):
+    """
+    yield the grades as csv text in batches of rows. the utf-8 bom keeps the
+    persian names readable when the file is opened in excel.
+    """
+    writer = csv.writer(_Echo())
+    yield "\ufeff" + writer.writerow(GRADE_EXPORT_FIELDS)
+    yield from _batched(writer.writerow(row) for row in iter_grade_export_rows(grades))
+
+
+def stream_grades_jsonl(grades):
+    yield from _batched(
+        json.dumps(dict(zip(GRADE_EXPORT_FIELDS, row)), ensure_ascii=False) + "\n"
+        for row in iter_grade_export_rows(grades)
+    )
+
+
+class PanelStats:
+    """
+    summary counters of the students shown on a panel. the students a view
+    registers with prefetch() are loaded together in one query the first
+    time a counter is read, and the instance is kept on the request so
+    template tags asking again never hit the database.
+    """
+
+    def __init__(self):
+        self._summaries = {}
+        self._pending = set()
+
+    @classmethod
+    def for_request(cls, request):
+        if request is None:
+            return cls()
+        stats = getattr(request, "_panel_stats", None)
+        if stats is None:
+            stats = request._panel_stats = cls()
+        return stats
+
+    def prefetch(self, students):
+        for student in students:
+            if student.id in self._summaries:
+                continue
+            if Student.summary.is_cached(student):
+                try:
+                    self._summaries[student.id] = student.summary
+                    continue
+                except StudentSummary.DoesNotExist:
+                    pass
+            self._pending.add(student.id)
+        return self
+
+    def _load(self):
+        pending, self._pending = self._pending, set()
+        summaries = StudentSummary.objects.in_bulk(pending, field_name="student_id")
+        if missing := pending - summaries.keys():
+            StudentSummary.objects.refresh(missing)
+            summaries.update(
+                StudentSummary.objects.in_bulk(missing, field_name="student_id")
+            )
+        self._summaries.update(summaries)
+
+    def get(self, student):
+        if student.id not in self._summaries:
+            self.prefetch([student])
+            self._load()
+        return self._summaries.get(student.id) or StudentSummary(student=student)
+
+    def lesson_count(self, student):
+        return self.get(student).lesson_count
+
+    def grade_count(self, student, status):
+        return self.get(student).grade_count(status)
+
+    def attendance_count(self, student, status):
+        return self.get(student).attendance_count(status)
+
+
+RANK_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+@dataclass(frozen=True)
+class GradeStanding:
+    rank: int
+    size: int
+    percentile: float
+    z_score: float
+
+
+def grade_standings(partitions):
+    """
+    class rank, percentile and z-score of every grade in the given
+    (lesson_id, month) partitions, keyed by grade id. cached partitions are
+    read back as is and the missing ones are computed together in one query
+    with window functions.
+    """
+    keys = {grade_rank_key(*partition): partition for partition in set(partitions)}
+    cached = cache.get_many(keys)
+    standings = {}
+    for value in cached.values():
+        standings.update(value)
+
+    missing = {keys[key] for key in keys.keys() - cached.keys()}
+    if not missing:
+        return standings
+
+    window = {"partition_by": [F("lesson_id"), F("month")]}
+    rows = (
+        Grade.objects.filter(
+            lesson_id__in={lesson_id for lesson_id, month in missing},
+            month__in={month for lesson_id, month in missing},
+        )
+        .annotate(
+            rank=Window(Rank(), order_by=F("score").desc(), **window),
+            percentile=Window(CumeDist(), order_by=F("score").asc(), **window),
+            size=Window(Count("id"), **window),
+            mean=Window(Avg("score"), **window),
+            mean_square=Window(Avg(F("score") * F("score")), **window),
+        )
+        .values_list(
+            "id",
+            "lesson_id",
+            "month",
+            "score",
+            "rank",
+            "size",
+            "percentile",
+            "mean",
+            "mean_square",
+        )
+    )
+
+    computed = defaultdict(dict)
+    for pk, lesson_id, month, score, rank, size, percentile, mean, mean_square in rows:
+        if (lesson_id, month) not in missing:
+            continue
+        std = math.sqrt(max(mean_square - mean * mean, 0.0))
+        computed[lesson_id, month][pk] = GradeStanding(
+            rank=rank,
+            size=size,
+            percentile=round(percentile * 100, 1),
+            z_score=round((score - mean) / std, 2) if std else 0.0,
+        )
+
+    cache.set_many(
+        {grade_rank_key(*partition): computed[partition] for partition in missing},
+        RANK_CACHE_TIMEOUT,
+    )
+    for value in computed.values():
+        standings.update(value)
+    return standings
+
+
+def attach_standings(grades):
+    grades = list(grades)
+    standings = grade_standings((grade.lesson_id, grade.month) for grade in grades)
+    for grade in grades:
+        grade.standing = standings.get(grade.id)
+    return grades
+
+
+PROVISION_STUDENT_FIELDS = (
+    "student",
+    "student_password",
+    "first_name",
+    "last_name",
+    "grade",
+)
+PROVISION_PARENT_FIELDS = (
+    "parent",
+    "parent_password",
+    "parent_first_name",
+    "parent_last_name",
+)
+PROVISION_ROW_FIELDS = PROVISION_STUDENT_FIELDS + PROVISION_PARENT_FIELDS
+
+
+@dataclass
+class ProvisionRowError:
+    row: int
+    username: str
+    message: str
+    data: dict = field(default_factory=dict)
+
+    def __str__(self):
+        return f"ردیف {self.row} ({self.username or '-'}): {self.message}"
+
+
+@dataclass
+class ProvisionReport:
+    students: int = 0
+    parents: int = 0
+    links: int = 0
+    existing: int = 0
+    errors: list = field(default_factory=list)
+
+    @property
+    def error_count(self):
+        return len(self.errors)
+
+
+def _clean_provision_row(row, grades):
+    row = {name: str(row.get(name) or "").strip() for name in PROVISION_ROW_FIELDS}
+    if not all(row[name] for name in ("student", "first_name", "last_name")):
+        raise forms.ValidationError(
+            "نام کاربری، نام و نام خانوادگی دانش آموز الزامی است."
+        )
+    if row["grade"] not in grades:
+        raise forms.ValidationError("پایه تحصیلی معتبر نیست.")
+    if row["parent"] == row["student"]:
+        raise forms.ValidationError("نام کاربری والدین و دانش آموز نباید یکی باشد.")
+    return row
+
+
+def _check_password(password):
+    if len(password) < 8:
+        raise forms.ValidationError("رمز عبور باید حداقل ۸ کاراکتر باشد.")
+
+
+def _init_worker():
+    django.setup()
+
+
+def password_pool(workers=None):
+    """process pool for hash_passwords, to be reused across batches"""
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+
+
+def hash_passwords(passwords, workers=None, pool=None):
+    """
+    hash the passwords across a process pool, in the given order. a pool
+    from password_pool() is used as is, otherwise one is started for this
+    call only.
+    """
+    passwords = list(passwords)
+    if workers == 1 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+    if pool is not None:
+        return list(pool.map(make_password, passwords, chunksize=16))
+    with password_pool(workers) as pool:
+        return list(pool.map(make_password, passwords, chunksize=16))
+
+
+def provision_users(
+    rows, workers=None, dry_run=False, batch_size=500, start=1, pool=None
+):
+    """
+    create the students, parents and parent-child links of a batch of rows.
+    usernames that already exist are reused instead of created again and
+    links use ignore_conflicts, so running the same file twice is harmless.
+    users are written with bulk_create, which never sends post_save, so
+    save_profile does not create a NewUser row for each of them and the
+    Student and Parents profiles are inserted here in bulk instead.
+    """
+    report = ProvisionReport()
+    grades = dict(Student._meta.get_field("grade").flatchoices)
+
+    cleaned = []
+    for index, row in enumerate(rows, start=start):
+        try:
+            cleaned.append((index, _clean_provision_row(row, grades)))
+        except forms.ValidationError as e:
+            report.errors.append(
+                ProvisionRowError(
+                    row=index,
+                    username=str(row.get("student") or ""),
+                    message=" ".join(e.messages),
+                    data=row,
+                )
+            )
+
+    usernames = {row["student"] for index, row in cleaned}
+    usernames |= {row["parent"] for index, row in cleaned if row["parent"]}
+    existing = {
+        user["username"]: user
+        for user in User.objects.filter(username__in=usernames).values(
+            "username",
+            "is_student",
+            "is_parents",
+            student=F("students__id"),
+            parent=F("parents__id"),
+        )
+    }
+
+    new_students, new_parents, links, accepted = {}, {}, set(), []
+    for index, row in cleaned:
+        try:
+            student, parent = row["student"], row["parent"]
+            if student in existing:
+                if not existing[student]["is_student"]:
+                    raise forms.ValidationError(
+                        f"کاربر {student} وجود دارد و دانش آموز نیست."
+                    )
+                if existing[student]["student"] is None:
+                    raise forms.ValidationError(
+                        f"کاربر {student} پروفایل دانش آموز ندارد."
+                    )
+            elif student in new_students or student in new_parents:
+                raise forms.ValidationError(f"نام کاربری {student} تکراری است.")
+            else:
+                _check_password(row["student_password"])
+
+            if parent:
+                if parent in existing:
+                    if not existing[parent]["is_parents"]:
+                        raise forms.ValidationError(
+                            f"کاربر {parent} وجود دارد و والدین نیست."
+                        )
+                    if existing[parent]["parent"] is None:
+                        raise forms.ValidationError(
+                            f"کاربر {parent} پروفایل والدین ندارد."
+                        )
+                elif parent in new_students:
+                    raise forms.ValidationError(f"نام کاربری {parent} تکراری است.")
+                elif parent not in new_parents:
+                    _check_password(row["parent_password"])
+                    if not (row["parent_first_name"] and row["parent_last_name"]):
+                        raise forms.ValidationError(
+                            "نام و نام خانوادگی والدین الزامی است."
+                        )
+        except forms.ValidationError as e:
+            report.errors.append(
+                ProvisionRowError(
+                    row=index,
+                    username=row["student"],
+                    message=" ".join(e.messages),
+                    data=row,
+                )
+            )
+            continue
+
+        if student in existing:
+            report.existing += 1
+        else:
+            new_students[student] = row
+        if parent and parent not in existing and parent not in new_parents:
+            new_parents[parent] = row
+        if parent:
+            links.add((parent, student))
+        accepted.append(index)
+
+    report.errors.sort(key=lambda error: error.row)
+    report.students, report.parents = len(new_students), len(new_parents)
+    if dry_run or not accepted:
+        report.links = len(links)
+        return report
+
+    hashes = hash_passwords(
+        [row["student_password"] for row in new_students.values()]
+        + [row["parent_password"] for row in new_parents.values()],
+        workers=workers,
+        pool=pool,
+    )
+    users = [
+        User(username=username, password=password, is_student=True, is_user=False)
+        for username, password in zip(new_students, hashes)
+    ] + [
+        User(username=username, password=password, is_parents=True, is_user=False)
+        for username, password in zip(new_parents, hashes[len(new_students) :])
+    ]
+
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=batch_size)
+        # bulk_create sends no post_save, so the username index is told here
+        transaction.on_commit(
+            lambda: [username_index.add(user.username) for user in users]
+        )
+        ids = dict(
+            User.objects.filter(username__in=usernames).values_list("username", "id")
+        )
+        Student.objects.bulk_create(
+            [
+                Student(
+                    user_id=ids[username],
+                    first_name=row["first_name"],
+                    last_name=row["last_name"],
+                    grade=row["grade"],
+                )
+                for username, row in new_students.items()
+            ],
+            batch_size=batch_size,
+        )
+        Parents.objects.bulk_create(
+            [
+                Parents(
+                    user_id=ids[username],
+                    first_name=row["parent_first_name"],
+                    last_name=row["parent_last_name"],
+                )
+                for username, row in new_parents.items()
+            ],
+            batch_size=batch_size,
+        )
+
+        student_ids = dict(
+            Student.objects.filter(user__username__in=usernames).values_list(
+                "user__username", "id"
+            )
+        )
+        parent_ids = dict(
+            Parents.objects.filter(user__username__in=usernames).values_list(
+                "user__username", "id"
+            )
+        )
+        through = Parents.child.through
+        before = through.objects.filter(parents_id__in=parent_ids.values()).count()
+        through.objects.bulk_create(
+            [
+                through(parents_id=parent_ids[parent], student_id=student_ids[student])
+                for parent, student in links
+                if parent in parent_ids and student in student_ids
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        report.links = (
+            through.objects.filter(parents_id__in=parent_ids.values()).count() - before
+        )
+    return report
+
+
+def provision_users_csv(fileobj, workers=None, chunk_size=500, dry_run=False):
+    """
+    stream a provisioning csv into provision_users in fixed-size chunks, one
+    transaction per chunk. yields one report per chunk.
+    """
+    reader = csv.DictReader(fileobj)
+    missing = set(PROVISION_STUDENT_FIELDS) - set(reader.fieldnames or ())
+    if missing:
+        raise forms.ValidationError(
+            f"ستون های {', '.join(sorted(missing))} در فایل وجود ندارند."
+        )
+
+    # one pool for the whole file, its processes start only once
+    with contextlib.ExitStack() as stack:
+        pool = None
+        if not dry_run and workers != 1:
+            pool = stack.enter_context(password_pool(workers))
+        start = 1
+        while chunk := list(islice(reader, chunk_size)):
+            yield provision_users(
+                chunk, workers=workers, dry_run=dry_run, start=start, pool=pool
+            )
+            start += len(chunk)
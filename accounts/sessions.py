@@ -0,0 +1,156 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError
+from django.contrib.sessions.backends.cached_db import (
+    SessionStore as CachedDBStore,
+)
+from django.contrib.sessions.models import Session
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class SessionWriter:
+    """
+    queue of session rows waiting to be written to the database. writes of
+    the same session are merged while they wait, and a background thread
+    flushes the queue with one upsert every `delay` seconds.
+    """
+
+    def __init__(self, delay):
+        self.delay = delay
+        self._pending = {}
+        self._lock = threading.Lock()
+        # held while a batch is written so delete() never races a flush
+        self.flush_lock = threading.Lock()
+        self._thread = None
+
+    def put(self, session_key, session_data, expire_date):
+        with self._lock:
+            self._pending[session_key] = (session_data, expire_date)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="session-writer", daemon=True
+                )
+                self._thread.start()
+
+    def get(self, session_key):
+        with self._lock:
+            return self._pending.get(session_key)
+
+    def discard(self, session_key):
+        with self._lock:
+            self._pending.pop(session_key, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.delay)
+            self.flush()
+            connections.close_all()
+
+    def flush(self):
+        with self.flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            try:
+                Session.objects.bulk_create(
+                    [
+                        Session(
+                            session_key=session_key,
+                            session_data=session_data,
+                            expire_date=expire_date,
+                        )
+                        for session_key, (session_data, expire_date) in batch.items()
+                    ],
+                    update_conflicts=True,
+                    unique_fields=["session_key"],
+                    update_fields=["session_data", "expire_date"],
+                )
+            except DatabaseError:
+                logger.exception("Error writing %d sessions", len(batch))
+                # newer writes that arrived meanwhile win over the failed ones
+                with self._lock:
+                    for session_key, row in batch.items():
+                        self._pending.setdefault(session_key, row)
+
+
+writer = SessionWriter(getattr(settings, "SESSION_WRITE_DELAY", 2))
+atexit.register(writer.flush)
+
+
+class SessionStore(CachedDBStore):
+    """
+    cached_db sessions whose database writes are deferred to SessionWriter.
+    the cache is always written first so every worker reads the new data
+    right away, while the database only sees the last of the writes made to
+    a session within SESSION_WRITE_DELAY seconds.
+    """
+
+    cache_key_prefix = "accounts.sessions"
+
+    def load(self):
+        data = self._cache.get(self.cache_key)
+        if data is not None:
+            return data
+
+        # evicted from the cache before its queued write reached the database
+        if pending := writer.get(self.session_key):
+            session_data, expire_date = pending
+        elif session := self._get_session_from_db():
+            session_data, expire_date = session.session_data, session.expire_date
+        else:
+            return {}
+        data = self.decode(session_data)
+        self._cache.set(self.cache_key, data, self.get_expiry_age(expiry=expire_date))
+        return data
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        age = self.get_expiry_age()
+        if must_create:
+            # the new key is only reserved in the cache, add() fails when
+            # another request took it in the meantime
+            if not self._cache.add(self.cache_key, data, age):
+                raise CreateError
+        else:
+            self._cache.set(self.cache_key, data, age)
+        writer.put(self.session_key, self.encode(data), self.get_expiry_date())
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        # logging out is rare, so it goes to the database right away and no
+        # queued write may bring the session back afterwards
+        with writer.flush_lock:
+            writer.discard(session_key)
+            super().delete(session_key)
+
+    @classmethod
+    def clear_expired(cls, chunk_size=1000, pause=0):
+        """
+        delete expired sessions a chunk at a time so the write lock is never
+        held for long. returns the number of deleted sessions.
+        """
+        deleted = 0
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=timezone.now())
+                .order_by("expire_date")
+                .values_list("session_key", flat=True)[:chunk_size]
+            )
+            if not keys:
+                return deleted
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            if pause:
+                time.sleep(pause)
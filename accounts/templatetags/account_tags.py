@@ -1,5 +1,5 @@
 from django import template
-from accounts.models import Lesson, AttendanceRecord, Grade, Student
+from accounts.services import PanelStats
 
 register = template.Library()
 
@@ -21,16 +21,22 @@ def truncate_chars(text, num_chars=30):
         return text[:num_chars] + "..."
 
 
-@register.simple_tag
-def get_lesson_count(user=None):
-    return Lesson.objects.filter(student=user).count()
+@register.simple_tag(takes_context=True)
+def get_lesson_count(context, user=None):
+    if user is None:
+        return 0
+    return PanelStats.for_request(context.get("request")).lesson_count(user)
 
 
-@register.simple_tag
-def get_status_grade(user=None, status=None):
-    return Grade.objects.filter(student=user, status=status).count()
+@register.simple_tag(takes_context=True)
+def get_status_grade(context, user=None, status=None):
+    if user is None:
+        return 0
+    return PanelStats.for_request(context.get("request")).grade_count(user, status)
 
 
-@register.simple_tag
-def attendancerecord_count(user=None, status=None):
-    return AttendanceRecord.objects.filter(student=user, status=status).count()
+@register.simple_tag(takes_context=True)
+def attendancerecord_count(context, user=None, status=None):
+    if user is None:
+        return 0
+    return PanelStats.for_request(context.get("request")).attendance_count(user, status)
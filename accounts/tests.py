@@ -1,3 +1,1562 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import jdatetime
+from django import forms
+from django.contrib.messages import get_messages
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .analytics import attendance_report, grade_distribution
+from .forms import validate_class_activity, validate_score
+from .reportcards import get_report_card, load_report_data
+from .models import (
+    AttendanceRecord,
+    ClassSession,
+    Comment,
+    Grade,
+    Lesson,
+    NewUser,
+    Parents,
+    Student,
+    StudentSummary,
+    Teacher,
+    TeacherContact,
+    User,
+    bump_grade_distribution,
+    comment_wall_version,
+    grade_distribution_version,
+    school_today,
+)
+from .services import (
+    GRADE_ROW_FIELDS,
+    PROVISION_ROW_FIELDS,
+    GradeStanding,
+    PanelStats,
+    ProvisionRowError,
+    attach_standings,
+    grade_standings,
+    ingest_grades,
+    provision_users,
+)
+from .sessions import SessionStore, SessionWriter
+from .usernames import BloomFilter, UsernameIndex, username_index
+
+LOCMEM_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "sessions": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "sessions",
+    },
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class IngestGradesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        ).teachers
+        # full_name_en is unique, the second profile would repeat the blank one
+        cls.teacher.full_name_en = "teacher"
+        cls.teacher.save()
+        other = User.objects.create_user(
+            "other", "password123", is_teacher=True, is_user=False
+        ).teachers
+        cls.student = User.objects.create_user(
+            "student", "password123", is_student=True, is_user=False
+        ).students
+        cls.lesson = Lesson.objects.create(
+            name="ریاضی", teacher=cls.teacher, grade="دهم", year="1403"
+        )
+        cls.lesson.student.add(cls.student)
+        physics = Lesson.objects.create(
+            name="فیزیک", teacher=other, grade="دهم", year="1403"
+        )
+        physics.student.add(cls.student)
+
+    def row(self, **values):
+        return {
+            "student": "student",
+            "lesson": "ریاضی",
+            "month": "مهر",
+            "score": "18",
+            "class_activity": "15",
+            "status": "good",
+            **values,
+        }
+
+    def test_valid_rows_are_created(self):
+        report = ingest_grades([self.row(), self.row(month="آبان", score="12.5")])
+        self.assertEqual(report.created, 2)
+        self.assertEqual(report.errors, [])
+        self.assertEqual(
+            sorted(Grade.objects.values_list("month", "score")),
+            [("آبان", 12.5), ("مهر", 18.0)],
+        )
+
+    def test_non_finite_scores_are_rejected(self):
+        rows = [self.row(score=value) for value in ("nan", "inf", "-inf", "1e999")]
+        rows += [self.row(class_activity=value) for value in ("nan", "inf")]
+        report = ingest_grades(rows)
+        self.assertEqual(report.created, 0)
+        self.assertEqual([error.row for error in report.errors], [1, 2, 3, 4, 5, 6])
+        self.assertFalse(Grade.objects.exists())
+
+    def test_out_of_range_scores_are_rejected(self):
+        report = ingest_grades(
+            [
+                self.row(score="-1"),
+                self.row(score="20.5"),
+                self.row(class_activity="21"),
+            ]
+        )
+        self.assertEqual(report.created, 0)
+        self.assertEqual(report.error_count, 3)
+
+    def test_bad_rows_do_not_block_good_ones(self):
+        report = ingest_grades(
+            [
+                self.row(student="nobody"),
+                self.row(),
+                self.row(month="ماه"),
+                self.row(status="unknown"),
+                self.row(score=""),
+            ]
+        )
+        self.assertEqual(report.created, 1)
+        self.assertEqual([error.row for error in report.errors], [1, 3, 4, 5])
+        self.assertEqual(report.errors[0].student, "nobody")
+
+    def test_lessons_are_restricted_to_the_teacher(self):
+        report = ingest_grades([self.row(lesson="فیزیک")], teacher=self.teacher)
+        self.assertEqual(report.created, 0)
+        self.assertEqual(report.error_count, 1)
+
+    def test_student_must_be_enrolled(self):
+        self.lesson.student.remove(self.student)
+        report = ingest_grades([self.row()])
+        self.assertEqual(report.created, 0)
+        self.assertEqual(
+            report.errors[0].message, "دانش آموز در این درس ثبت نام نشده است."
+        )
+
+    def test_lesson_name_shared_by_two_lessons(self):
+        # same name in another grade level, the student is only enrolled there
+        self.lesson.student.remove(self.student)
+        other = Lesson.objects.create(
+            name="ریاضی", teacher=self.teacher, grade="یازدهم", year="1403"
+        )
+        other.student.add(self.student)
+
+        report = ingest_grades([self.row()], teacher=self.teacher)
+        self.assertEqual(report.created, 0)
+        self.assertEqual(report.errors[0].message, "چند درس با این نام وجود دارد.")
+
+        report = ingest_grades(
+            [self.row(lesson=str(other.id))], teacher=self.teacher, lesson_field="id"
+        )
+        self.assertEqual(report.created, 1)
+        self.assertEqual(Grade.objects.get().lesson, other)
+
+    def test_dry_run_creates_nothing(self):
+        report = ingest_grades([self.row()], dry_run=True)
+        self.assertEqual(report.created, 1)
+        self.assertFalse(Grade.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ImportGradesCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user(
+            "student", "password123", is_student=True, is_user=False
+        ).students
+        teacher = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        ).teachers
+        cls.lesson = Lesson.objects.create(
+            name="ریاضی", teacher=teacher, grade="دهم", year="1403"
+        )
+        cls.lesson.student.add(cls.student)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "grades.csv")
+        self.rejected = os.path.join(directory.name, "rejected.csv")
+
+    def write(self, *rows, header=GRADE_ROW_FIELDS):
+        with open(self.path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    def call(self, *args):
+        out = io.StringIO()
+        call_command("import_grades", self.path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_valid_rows_are_imported_and_bad_ones_written_out(self):
+        lesson = str(self.lesson.id)
+        self.write(
+            ("student", lesson, "مهر", "18", "15", "good"),
+            ("nobody", lesson, "مهر", "18", "15", "good"),
+            ("student", lesson, "آبان", "nan", "15", "good"),
+            ("student", lesson, "آذر", "12", "10", "average"),
+        )
+        output = self.call("--rejected", self.rejected, "--chunk-size", "2")
+        self.assertIn("2 grades imported, 2 rows rejected", output)
+        self.assertEqual(
+            sorted(Grade.objects.values_list("month", flat=True)), ["آذر", "مهر"]
+        )
+
+        with open(self.rejected, newline="", encoding="utf-8-sig") as f:
+            rejected = list(csv.reader(f))
+        self.assertEqual(rejected[0], ["row", *GRADE_ROW_FIELDS, "error"])
+        self.assertEqual([row[0] for row in rejected[1:]], ["2", "3"])
+        self.assertEqual(rejected[1][1], "nobody")
+        self.assertEqual(rejected[2][-1], "نمره باید عدد باشد.")
+
+    def test_dry_run_writes_nothing(self):
+        self.write(("student", str(self.lesson.id), "مهر", "18", "15", "good"))
+        self.assertIn("1 grades validated, 0 rows rejected", self.call("--dry-run"))
+        self.assertFalse(Grade.objects.exists())
+
+    def test_lesson_names_are_not_ids(self):
+        self.write(("student", "ریاضی", "مهر", "18", "15", "good"))
+        self.assertIn("0 grades imported, 1 rows rejected", self.call())
+
+    def test_invalid_input_raises_command_error(self):
+        self.write(("student",), header=("student",))
+        with self.assertRaisesMessage(CommandError, "ستون های"):
+            self.call()
+        with self.assertRaisesMessage(CommandError, "--chunk-size"):
+            self.call("--chunk-size", "0")
+        with self.assertRaisesMessage(CommandError, "does not exist"):
+            self.call("--teacher", "nobody")
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE, SESSION_ENGINE="django.contrib.sessions.backends.cache"
+)
+class GradeExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher_user = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        )
+        cls.teacher_user.teachers.full_name_en = "teacher"
+        cls.teacher_user.teachers.save()
+        cls.other_user = User.objects.create_user(
+            "other", "password123", is_teacher=True, is_user=False
+        )
+        student = User.objects.create_user(
+            "student", "password123", is_student=True, is_user=False
+        ).students
+        student.first_name, student.last_name = "علی", "رضایی"
+        student.save()
+        cls.lesson = Lesson.objects.create(
+            name="ریاضی", teacher=cls.teacher_user.teachers, grade="دهم", year="1403"
+        )
+        other_lesson = Lesson.objects.create(
+            name="فیزیک", teacher=cls.other_user.teachers, grade="دهم", year="1403"
+        )
+        for lesson, month, score in (
+            (cls.lesson, "مهر", 18),
+            (cls.lesson, "آبان", 12.5),
+            (other_lesson, "مهر", 10),
+        ):
+            Grade.objects.create(
+                student=student,
+                lesson=lesson,
+                month=month,
+                score=score,
+                class_activity=15,
+                status="good",
+            )
+
+    def export(self, name, *args, **params):
+        response = self.client.get(reverse(name, args=args), params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_lesson_csv(self):
+        self.client.force_login(self.teacher_user)
+        content = self.export("account:score_export_lesson", self.lesson.pk)
+        self.assertTrue(content.startswith("\ufeff"))
+        rows = list(csv.DictReader(io.StringIO(content.lstrip("\ufeff"))))
+        self.assertEqual(
+            [(row["lesson_name"], row["month"], row["score"]) for row in rows],
+            [("ریاضی", "مهر", "18.0"), ("ریاضی", "آبان", "12.5")],
+        )
+        self.assertEqual(rows[0]["student"], "student")
+        self.assertEqual(rows[0]["student_name"], "علی رضایی")
+
+    def test_teacher_jsonl(self):
+        self.client.force_login(self.teacher_user)
+        content = self.export("account:score_export_teacher", format="jsonl")
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual({row["lesson_name"] for row in rows}, {"ریاضی"})
+        self.assertEqual(len(rows), 2)
+
+    def test_access(self):
+        url = reverse("account:score_export_lesson", args=(self.lesson.pk,))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(self.other_user)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(
+            self.client.get(reverse("account:score_export_all")).status_code, 403
+        )
+        self.client.force_login(self.teacher_user)
+        self.assertEqual(self.client.get(url, {"format": "xml"}).status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class StudentSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        ).teachers
+        cls.student = User.objects.create_user(
+            "student", "password123", is_student=True, is_user=False
+        ).students
+        cls.lessons = [
+            Lesson.objects.create(name=name, teacher=teacher, grade="دهم", year="1403")
+            for name in ("ریاضی", "فیزیک")
+        ]
+
+    def summary(self):
+        return StudentSummary.objects.get(student=self.student)
+
+    def grade(self, lesson, score, status, month="مهر"):
+        return Grade.objects.create(
+            student=self.student,
+            lesson=lesson,
+            month=month,
+            score=score,
+            class_activity=15,
+            status=status,
+        )
+
+    def test_signals_keep_the_summary_in_sync(self):
+        math, physics = self.lessons
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.lessons.add(math, physics)
+        self.assertEqual(self.summary().lesson_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grade(math, 18, "great")
+            grade = self.grade(physics, 12, "average")
+        summary = self.summary()
+        self.assertEqual((summary.great_count, summary.average_count), (1, 1))
+        self.assertEqual(summary.average_score, 15)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            grade.delete()
+            physics.delete()
+        summary = self.summary()
+        self.assertEqual((summary.average_count, summary.lesson_count), (0, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            math.student.clear()
+        self.assertEqual(self.summary().lesson_count, 0)
+
+    def test_nothing_is_refreshed_before_commit(self):
+        with self.captureOnCommitCallbacks():
+            self.grade(self.lessons[0], 18, "great")
+        self.assertFalse(StudentSummary.objects.exists())
+
+    def test_rebuild_command_repairs_drift(self):
+        self.grade(self.lessons[0], 18, "great")
+        StudentSummary.objects.update_or_create(
+            student=self.student, defaults={"great_count": 7}
+        )
+        out = io.StringIO()
+        call_command("rebuild_student_summaries", "--chunk-size", "1", stdout=out)
+        self.assertIn("1 student summaries rebuilt", out.getvalue())
+        self.assertEqual(self.summary().great_count, 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PanelStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        ).teachers
+        lesson = Lesson.objects.create(
+            name="ریاضی", teacher=teacher, grade="دهم", year="1403"
+        )
+        cls.students = [
+            User.objects.create_user(
+                f"student{i}", "password123", is_student=True, is_user=False
+            ).students
+            for i in range(2)
+        ]
+        lesson.student.add(*cls.students)
+        for student, status in zip(cls.students, ("great", "good")):
+            Grade.objects.create(
+                student=student,
+                lesson=lesson,
+                month="مهر",
+                score=18,
+                class_activity=15,
+                status=status,
+            )
+        StudentSummary.objects.refresh([student.id for student in cls.students])
+
+    def test_prefetched_students_load_in_one_query(self):
+        first, second = self.students
+        stats = PanelStats().prefetch(self.students)
+        with self.assertNumQueries(1):
+            self.assertEqual(stats.grade_count(first, "great"), 1)
+            self.assertEqual(stats.grade_count(second, "good"), 1)
+            self.assertEqual(stats.lesson_count(second), 1)
+            self.assertEqual(stats.attendance_count(first, "absent"), 0)
+            self.assertEqual(stats.grade_count(first, "unknown"), 0)
+
+    def test_stats_are_kept_on_the_request(self):
+        request = RequestFactory().get("/")
+        stats = PanelStats.for_request(request)
+        self.assertIs(PanelStats.for_request(request), stats)
+        self.assertIsNot(PanelStats.for_request(None), stats)
+
+    def test_missing_summaries_are_built(self):
+        StudentSummary.objects.all().delete()
+        stats = PanelStats()
+        self.assertEqual(stats.grade_count(self.students[0], "great"), 1)
+        self.assertEqual(StudentSummary.objects.count(), 1)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE, SESSION_ENGINE="django.contrib.sessions.backends.cache"
+)
+class ParentsPanelTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        ).teachers
+        cls.lesson = Lesson.objects.create(
+            name="ریاضی", teacher=teacher, grade="دهم", year="1403"
+        )
+        cls.parent_user = User.objects.create_user(
+            "parent", "password123", is_parents=True, is_user=False
+        )
+        cls.children = [
+            User.objects.create_user(
+                f"child{i}", "password123", is_student=True, is_user=False
+            ).students
+            for i in range(2)
+        ]
+        cls.parent_user.parents.child.add(*cls.children)
+
+    def setUp(self):
+        self.client.force_login(self.parent_user)
+
+    def add_grades(self, student, count):
+        Grade.objects.bulk_create(
+            Grade(
+                student=student,
+                lesson=self.lesson,
+                month="مهر",
+                score=i % 20,
+                class_activity=15,
+                status="good",
+            )
+            for i in range(count)
+        )
+
+    def test_panel_queries_do_not_grow_with_history(self):
+        url = reverse("account:parents_profile")
+        self.add_grades(self.children[0], 1)
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as short:
+            self.client.get(url)
+        self.add_grades(self.children[0], 30)
+        self.add_grades(self.children[1], 30)
+        with CaptureQueriesContext(connection) as long:
+            response = self.client.get(url)
+        self.assertEqual(len(long), len(short))
+
+        first, second = response.context["children"]
+        self.assertEqual(len(first.recent_grades), 10)
+        self.assertEqual(first.grades_before, first.recent_grades[-1].id)
+        self.assertEqual(first.recent_attendancerecords, [])
+        self.assertIsNone(first.attendancerecords_before)
+
+    def test_history_pages(self):
+        child = self.children[0]
+        self.add_grades(child, 12)
+        ids = list(child.grades.order_by("-id").values_list("id", flat=True))
+        url = reverse("account:parents_history", args=(child.pk, "grades"))
+
+        response = self.client.get(url)
+        self.assertEqual(len(response.context["grades"]), 10)
+        self.assertEqual(response["X-Next-Url"], f"{url}?before={ids[9]}")
+
+        response = self.client.get(response["X-Next-Url"])
+        self.assertEqual([grade.id for grade in response.context["grades"]], ids[10:])
+        self.assertNotIn("X-Next-Url", response)
+
+    def test_history_of_other_children_is_hidden(self):
+        stranger = User.objects.create_user(
+            "stranger", "password123", is_student=True, is_user=False
+        ).students
+        for args in ((stranger.pk, "grades"), (self.children[0].pk, "unknown")):
+            response = self.client.get(reverse("account:parents_history", args=args))
+            self.assertEqual(response.status_code, 404)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE, SESSION_ENGINE="django.contrib.sessions.backends.cache"
+)
+class TeacherPanelCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher_user = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        )
+        cls.teacher = cls.teacher_user.teachers
+        # the gradebook is only shown to teachers allowed to grade
+        cls.teacher.status = True
+        cls.teacher.save()
+        cls.lesson = Lesson.objects.create(
+            name="ریاضی", teacher=cls.teacher, grade="دهم", year="1403"
+        )
+        cls.student = User.objects.create_user(
+            "student", "password123", is_student=True, is_user=False
+        ).students
+        cls.lesson.student.add(cls.student)
+
+    def setUp(self):
+        self.client.force_login(self.teacher_user)
+        self.addCleanup(caches["default"].clear)
+
+    def panel(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("account:teacher_profile"))
+        tables = " ".join(query["sql"] for query in queries)
+        return response.content.decode(), tables
+
+    def test_cached_fragments_skip_their_queries(self):
+        content, tables = self.panel()
+        self.assertIn("@student", content)
+        self.assertIn('SELECT "accounts_lesson_student"', tables)
+        self.assertIn("accounts_teachercontact", tables)
+
+        content, tables = self.panel()
+        self.assertIn("@student", content)
+        self.assertNotIn("accounts_teachercontact", tables)
+        self.assertNotIn('SELECT "accounts_lesson_student"', tables)
+
+    def test_changes_invalidate_the_fragments(self):
+        self.panel()
+        newcomer = User.objects.create_user(
+            "newcomer", "password123", is_student=True, is_user=False
+        ).students
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lesson.student.add(newcomer)
+        self.assertIn("@newcomer", self.panel()[0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TeacherContact.objects.create(
+                teacher=self.teacher,
+                student=self.student,
+                student_name="علی",
+                subject="سوال درباره امتحان",
+                message="متن",
+            )
+        self.assertIn("سوال درباره امتحان", self.panel()[0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student.first_name = "نام تازه"
+            self.student.save()
+        self.assertIn("نام تازه", self.panel()[0])
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE, SESSION_ENGINE="django.contrib.sessions.backends.cache"
+)
+class UnreadMessagesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher_user = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        )
+        cls.teacher = cls.teacher_user.teachers
+        cls.teacher.full_name_en = "teacher"
+        cls.teacher.save()
+        cls.other = User.objects.create_user(
+            "other", "password123", is_teacher=True, is_user=False
+        ).teachers
+        cls.student = User.objects.create_user(
+            "student", "password123", is_student=True, is_user=False
+        ).students
+
+    def contact(self, teacher=None, **values):
+        return TeacherContact.objects.create(
+            teacher=teacher or self.teacher,
+            student=self.student,
+            student_name="علی",
+            subject="سوال",
+            message="متن",
+            **values,
+        )
+
+    def unread(self, teacher=None):
+        teacher = teacher or self.teacher
+        teacher.refresh_from_db(fields=["unread_messages"])
+        return teacher.unread_messages
+
+    def test_counter_follows_saves_and_deletes(self):
+        first, second = self.contact(), self.contact()
+        self.contact(is_read=True)
+        self.assertEqual(self.unread(), 2)
+
+        first.is_read = True
+        first.save()
+        self.assertEqual(self.unread(), 1)
+
+        second.teacher = self.other
+        second.save()
+        self.assertEqual((self.unread(), self.unread(self.other)), (0, 1))
+
+        second.delete()
+        self.assertEqual(self.unread(self.other), 0)
+
+    def test_stale_teacher_does_not_overwrite_the_counter(self):
+        stale = Teacher.objects.get(pk=self.teacher.pk)
+        self.contact()
+        stale.degree = "کارشناسی"
+        stale.save()
+        self.assertEqual(self.unread(), 1)
+
+    def test_read_view(self):
+        first = self.contact()
+        self.contact()
+        self.client.force_login(self.teacher_user)
+        url = reverse("account:teacher_inbox_read", args=(first.pk,))
+        self.assertEqual(self.client.post(url).json(), {"unread": 1})
+        # reading twice does not lower the counter again
+        self.assertEqual(self.client.post(url).json(), {"unread": 1})
+
+        other = self.contact(teacher=self.other)
+        url = reverse("account:teacher_inbox_read", args=(other.pk,))
+        self.assertEqual(self.client.post(url).json(), {"unread": 1})
+        self.assertEqual(self.unread(self.other), 1)
+
+    def test_unread_inbox_page(self):
+        read = self.contact(is_read=True)
+        unread = self.contact()
+        self.client.force_login(self.teacher_user)
+        response = self.client.get(reverse("account:teacher_inbox"), {"unread": "1"})
+        self.assertEqual(list(response.context["teacher_contact"]), [unread])
+        response = self.client.get(reverse("account:teacher_inbox"))
+        self.assertEqual(list(response.context["teacher_contact"]), [unread, read])
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE, SESSION_ENGINE="django.contrib.sessions.backends.cache"
+)
+class TeacherPanelGradesTests(TestCase):
+    def test_grades_go_to_the_posted_lesson_id(self):
+        teacher_user = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        )
+        student = User.objects.create_user(
+            "student", "password123", is_student=True, is_user=False
+        ).students
+        first, second = (
+            Lesson.objects.create(
+                name="ریاضی", teacher=teacher_user.teachers, grade=grade, year="1403"
+            )
+            for grade in ("دهم", "یازدهم")
+        )
+        second.student.add(student)
+
+        self.client.force_login(teacher_user)
+        response = self.client.post(
+            reverse("account:teacher_profile"),
+            {
+                "students[]": ["student"],
+                "lessons[]": [str(second.id)],
+                "scores[]": ["17"],
+                "class_activities[]": ["16"],
+                "months[]": ["مهر"],
+                "statuses[]": ["good"],
+            },
+        )
+        self.assertRedirects(
+            response, reverse("account:teacher_profile"), fetch_redirect_response=False
+        )
+        self.assertFalse(first.grades.exists())
+        self.assertEqual(second.grades.get().score, 17)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE, SESSION_ENGINE="django.contrib.sessions.backends.cache"
+)
+class AttendanceRollCallTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher_user = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        )
+        cls.lesson = Lesson.objects.create(
+            name="ریاضی", teacher=cls.teacher_user.teachers, grade="دهم", year="1403"
+        )
+        cls.students = [
+            User.objects.create_user(
+                f"student{i}", "password123", is_student=True, is_user=False
+            ).students
+            for i in range(3)
+        ]
+        cls.lesson.student.add(*cls.students)
+
+    def setUp(self):
+        self.client.force_login(self.teacher_user)
+
+    def roll_call(self, *statuses):
+        response = self.client.post(
+            reverse("account:attendancerecord", args=(self.lesson.pk,)),
+            {
+                "period": "1",
+                **{
+                    f"attendance_{student.pk}": status
+                    for student, status in zip(self.students, statuses)
+                },
+            },
+        )
+        # messages of earlier posts stay queued, the redirect is not followed
+        return [str(message) for message in get_messages(response.wsgi_request)][-1]
+
+    def test_resubmitting_updates_only_changed_records(self):
+        message = self.roll_call("present", "absent", "late")
+        self.assertIn("3 رکورد جدید", message)
+
+        message = self.roll_call("present", "present", "late")
+        self.assertIn("1 رکورد به‌روزرسانی", message)
+        self.assertNotIn("رکورد جدید", message)
+        self.assertEqual(
+            sorted(AttendanceRecord.objects.values_list("student_id", "status")),
+            sorted(
+                zip(
+                    [student.pk for student in self.students],
+                    ["present", "present", "late"],
+                )
+            ),
+        )
+
+    def test_unchanged_roll_call_writes_nothing(self):
+        self.roll_call("present", "absent", "late")
+        with mock.patch.object(AttendanceRecord.objects, "bulk_update") as bulk_update:
+            message = self.roll_call("present", "absent", "late")
+        bulk_update.assert_called_once_with([], ["status"])
+        self.assertIn("بدون تغییر", message)
+
+
+class ClassSessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        ).teachers
+        cls.lesson = Lesson.objects.create(
+            name="ریاضی", teacher=teacher, grade="دهم", year="1403"
+        )
+        cls.student = User.objects.create_user(
+            "student", "password123", is_student=True, is_user=False
+        ).students
+
+    def test_today_reuses_the_session_of_a_period(self):
+        session = ClassSession.objects.today(self.lesson, 2)
+        self.assertEqual(ClassSession.objects.today(self.lesson, 2), session)
+        self.assertNotEqual(ClassSession.objects.today(self.lesson, 3), session)
+        self.assertEqual(session.date, school_today())
+
+    def test_session_is_unique_per_lesson_date_and_period(self):
+        ClassSession.objects.today(self.lesson)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ClassSession.objects.create(
+                lesson=self.lesson, date=school_today(), period=1
+            )
+
+    def test_one_record_per_student_and_session(self):
+        session = ClassSession.objects.today(self.lesson)
+        AttendanceRecord.objects.create(
+            student=self.student, lesson=self.lesson, session=session
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AttendanceRecord.objects.create(
+                student=self.student, lesson=self.lesson, session=session
+            )
+
+
+class AttendanceReportTests(TestCase):
+    start = jdatetime.date(1403, 7, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        ).teachers
+        cls.math, cls.physics = (
+            Lesson.objects.create(name=name, teacher=teacher, grade="دهم", year="1403")
+            for name in ("ریاضی", "فیزیک")
+        )
+        cls.ali, cls.reza = (
+            User.objects.create_user(
+                username, "password123", is_student=True, is_user=False
+            ).students
+            for username in ("ali", "reza")
+        )
+        cls.ali.first_name, cls.reza.first_name = "علی", "رضا"
+        cls.ali.save()
+        cls.reza.save()
+
+        # ali's absences in physics make a run of three, the ones of math
+        # on the days in between must not break or extend it
+        records = [
+            (cls.ali, cls.math, 0, "present"),
+            (cls.ali, cls.physics, 1, "absent"),
+            (cls.ali, cls.physics, 2, "absent"),
+            (cls.ali, cls.math, 3, "present"),
+            (cls.ali, cls.physics, 4, "absent"),
+            (cls.ali, cls.physics, 5, "present"),
+            (cls.ali, cls.physics, 6, "absent"),
+            (cls.ali, cls.math, 10, "absent"),
+            (cls.ali, cls.math, 13, "present"),
+            (cls.reza, cls.math, 13, "late"),
+        ]
+        for student, lesson, day, status in records:
+            session, _ = ClassSession.objects.get_or_create(
+                lesson=lesson, date=cls.start + jdatetime.timedelta(days=day)
+            )
+            AttendanceRecord.objects.create(
+                student=student, lesson=lesson, session=session, status=status
+            )
+
+    def report(self, level):
+        report = attendance_report(
+            self.start, self.start + jdatetime.timedelta(days=20)
+        )
+        return {row["label"]: row for row in report[level]}
+
+    def test_students(self):
+        ali, reza = self.report("student").values()
+        self.assertEqual(ali["label"], str(self.ali))
+        self.assertEqual((ali["total"], ali["absence_rate"]), (9, 55.6))
+        self.assertEqual(ali["longest_streak"], 3)
+        # last week 1 of 2 absent, the week before 4 of 7
+        self.assertEqual(ali["trend"], -7.1)
+        self.assertEqual((reza["lateness_rate"], reza["absence_rate"]), (100.0, 0.0))
+
+    def test_lessons(self):
+        lessons = self.report("lesson")
+        math, physics = lessons["ریاضی"], lessons["فیزیک"]
+        self.assertEqual(list(lessons), ["فیزیک", "ریاضی"])
+        self.assertEqual((math["total"], math["longest_streak"]), (5, 1))
+        self.assertEqual((physics["total"], physics["longest_streak"]), (5, 3))
+        # math: 1 of 3 absent last week, none the week before
+        self.assertEqual((math["trend"], physics["trend"]), (33.3, -80.0))
+
+    def test_grade_levels_and_range(self):
+        (level,) = self.report("grade").values()
+        self.assertEqual(level["total"], 10)
+        report = attendance_report(
+            self.start + jdatetime.timedelta(days=7),
+            self.start + jdatetime.timedelta(days=12),
+        )
+        self.assertEqual([row["total"] for row in report["lesson"]], [1])
+        empty = attendance_report(
+            jdatetime.date(1402, 7, 1), jdatetime.date(1402, 8, 1)
+        )
+        self.assertEqual(empty, {"lesson": [], "grade": [], "student": []})
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ReportCardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        ).teachers
+        lesson = Lesson.objects.create(
+            name="ریاضی", teacher=teacher, grade="دهم", year="1403"
+        )
+        cls.students = [
+            User.objects.create_user(
+                f"student{i}", "password123", is_student=True, is_user=False
+            ).students
+            for i in range(2)
+        ]
+        lesson.student.add(*cls.students)
+        for month, score in (("مهر", 18), ("آبان", 15)):
+            Grade.objects.create(
+                student=cls.students[0],
+                lesson=lesson,
+                month=month,
+                score=score,
+                class_activity=15,
+                status="good",
+            )
+        StudentSummary.objects.refresh([student.id for student in cls.students])
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        settings = override_settings(REPORT_CARD_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_report_data_of_a_batch(self):
+        with self.assertNumQueries(4):
+            data = load_report_data([student.id for student in self.students])
+        first, second = (data[student.id] for student in self.students)
+        (lesson,) = first["lessons"]
+        self.assertEqual(lesson["months"][:3], [(18, 15), (15, 15), None])
+        self.assertEqual((lesson["average"], first["average"]), (16.5, 16.5))
+        self.assertIsNone(second["average"])
+
+    def test_card_is_rendered_once_per_change(self):
+        student = self.students[0]
+        path = get_report_card(student)
+        self.assertTrue(path.startswith(self.root))
+        with mock.patch("accounts.reportcards.render_card") as render_card:
+            self.assertEqual(get_report_card(student), path)
+        render_card.assert_not_called()
+
+        StudentSummary.objects.filter(student=student).update(
+            updated_date=timezone.now() + timedelta(hours=1)
+        )
+        new_path = get_report_card(student)
+        self.assertNotEqual(new_path, path)
+        self.assertEqual(
+            os.listdir(os.path.dirname(path)), [os.path.basename(new_path)]
+        )
+
+    def test_command_skips_up_to_date_cards(self):
+        out = io.StringIO()
+        call_command("generate_report_cards", "--workers", "1", stdout=out)
+        self.assertIn("2 rendered, 0 up to date, 0 failed", out.getvalue())
+        call_command("generate_report_cards", "--workers", "1", stdout=out)
+        self.assertIn("0 rendered, 2 up to date, 0 failed", out.getvalue())
+        with self.assertRaisesMessage(CommandError, "unknown grade level"):
+            call_command("generate_report_cards", "--grade", "صدم")
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class GradeStandingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        teacher = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        ).teachers
+        cls.lesson = Lesson.objects.create(
+            name="ریاضی", teacher=teacher, grade="دهم", year="1403"
+        )
+        cls.students = [
+            User.objects.create_user(
+                f"student{i}", "password123", is_student=True, is_user=False
+            ).students
+            for i in range(3)
+        ]
+        cls.grades = [
+            cls.grade(student, score)
+            for student, score in zip(cls.students, (18, 15, 15))
+        ]
+        # another month is ranked on its own
+        cls.grade(cls.students[0], 10, month="آبان")
+
+    @classmethod
+    def grade(cls, student, score, month="مهر"):
+        return Grade.objects.create(
+            student=student,
+            lesson=cls.lesson,
+            month=month,
+            score=score,
+            class_activity=15,
+            status="good",
+        )
+
+    def setUp(self):
+        self.addCleanup(caches["default"].clear)
+
+    def test_rank_percentile_and_z_score(self):
+        first, second, third = (
+            grade.standing for grade in attach_standings(self.grades)
+        )
+        self.assertEqual(
+            first, GradeStanding(rank=1, size=3, percentile=100.0, z_score=1.41)
+        )
+        self.assertEqual(
+            second, GradeStanding(rank=2, size=3, percentile=66.7, z_score=-0.71)
+        )
+        self.assertEqual(third, second)
+        (standing,) = grade_standings([(self.lesson.id, "آبان")]).values()
+        self.assertEqual(standing, GradeStanding(1, 1, 100.0, 0.0))
+
+    def test_partitions_are_cached_until_a_grade_changes(self):
+        partition = (self.lesson.id, "مهر")
+        grade_standings([partition])
+        with self.assertNumQueries(0):
+            self.assertEqual(len(grade_standings([partition])), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grade(self.students[1], 20)
+        standings = grade_standings([partition])
+        self.assertEqual(len(standings), 4)
+        self.assertEqual(standings[self.grades[0].id].rank, 2)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE, SESSION_ENGINE="django.contrib.sessions.backends.cache"
+)
+class GradeDistributionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher_user = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        )
+        cls.teacher_user.teachers.full_name_en = "teacher"
+        cls.teacher_user.teachers.save()
+        cls.lesson = Lesson.objects.create(
+            name="ریاضی", teacher=cls.teacher_user.teachers, grade="دهم", year="1403"
+        )
+        cls.student = User.objects.create_user(
+            "student", "password123", is_student=True, is_user=False
+        ).students
+        for month, score in (
+            ("آبان", 12),
+            ("مهر", 18),
+            ("مهر", 9),
+            ("آبان", 14),
+            ("مهر", 15),
+        ):
+            cls.grade(month, score)
+
+    @classmethod
+    def grade(cls, month, score):
+        return Grade.objects.create(
+            student=cls.student,
+            lesson=cls.lesson,
+            month=month,
+            score=score,
+            class_activity=20,
+            status="good",
+        )
+
+    def setUp(self):
+        self.addCleanup(caches["default"].clear)
+
+    def test_statistics_per_month(self):
+        distribution = grade_distribution(self.lesson.id)
+        mehr, aban = distribution["months"]
+        self.assertEqual((mehr["month"], aban["month"]), ("مهر", "آبان"))
+        self.assertEqual(
+            mehr["score"],
+            {
+                "mean": 14.0,
+                "median": 15.0,
+                "std": 3.74,
+                "pass_rate": 66.7,
+                "histogram": [0, 0, 0, 0, 1, 0, 0, 1, 0, 1],
+            },
+        )
+        self.assertEqual((aban["score"]["mean"], aban["score"]["median"]), (13, 13))
+        total = distribution["total"]
+        self.assertEqual((total["month"], total["count"]), ("کل", 5))
+        self.assertEqual(total["score"]["median"], 14.0)
+        self.assertEqual(total["class_activity"]["histogram"][-1], 5)
+
+    def test_cached_until_the_version_is_bumped(self):
+        grade_distribution(self.lesson.id)
+        with self.assertNumQueries(0):
+            grade_distribution(self.lesson.id)
+
+        version = grade_distribution_version(self.lesson.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.grade("آذر", 20)
+        self.assertNotEqual(grade_distribution_version(self.lesson.id), version)
+        self.assertEqual(grade_distribution(self.lesson.id)["total"]["count"], 6)
+
+        version = grade_distribution_version(self.lesson.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_grade_distribution([self.lesson.id])
+        self.assertNotEqual(grade_distribution_version(self.lesson.id), version)
+
+    def test_view_is_limited_to_the_lesson_teacher(self):
+        url = reverse("account:score_distribution", args=(self.lesson.id,))
+        self.client.force_login(self.teacher_user)
+        self.assertEqual(self.client.get(url).json()["total"]["count"], 5)
+        other = User.objects.create_user(
+            "other", "password123", is_teacher=True, is_user=False
+        )
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(self.student.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE,
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class ProvisionUsersTests(TestCase):
+    def row(self, student, parent="", **values):
+        return {
+            "student": student,
+            "student_password": "password123",
+            "first_name": "علی",
+            "last_name": "رضایی",
+            "grade": "دهم کامپیوتر",
+            "parent": parent,
+            "parent_password": "password123",
+            "parent_first_name": "حسن",
+            "parent_last_name": "رضایی",
+            **values,
+        }
+
+    def test_students_parents_and_links_are_created(self):
+        report = provision_users(
+            [self.row("ali", "hasan"), self.row("sara", "hasan"), self.row("reza")],
+            workers=1,
+        )
+        self.assertEqual(
+            (report.students, report.parents, report.links, report.errors),
+            (3, 1, 2, []),
+        )
+        parent = Parents.objects.get(user__username="hasan")
+        self.assertEqual(
+            sorted(parent.child.values_list("user__username", flat=True)),
+            ["ali", "sara"],
+        )
+        ali = Student.objects.get(user__username="ali")
+        self.assertEqual((ali.first_name, ali.grade), ("علی", "دهم کامپیوتر"))
+        self.assertTrue(ali.user.check_password("password123"))
+        self.assertTrue(ali.user.is_student)
+        self.assertFalse(NewUser.objects.exists())
+
+    def test_rerunning_is_harmless(self):
+        rows = [self.row("ali", "hasan"), self.row("sara", "hasan")]
+        provision_users(rows, workers=1)
+        report = provision_users(rows + [self.row("reza", "hasan")], workers=1)
+        self.assertEqual(
+            (report.students, report.parents, report.links, report.existing),
+            (1, 0, 1, 2),
+        )
+        self.assertEqual(User.objects.count(), 4)
+        self.assertEqual(Parents.child.through.objects.count(), 3)
+
+    def test_invalid_rows_are_reported(self):
+        User.objects.create_user("teacher", "password123", is_teacher=True)
+        report = provision_users(
+            [
+                self.row("ali"),
+                self.row("ali"),
+                self.row("bad", grade="صدم"),
+                self.row("short", student_password="123"),
+                self.row("teacher"),
+                self.row("same", "same"),
+                self.row("orphan", "parent", parent_first_name=""),
+                self.row("", first_name=""),
+            ],
+            workers=1,
+        )
+        self.assertEqual(report.students, 1)
+        self.assertTrue(all(isinstance(e, ProvisionRowError) for e in report.errors))
+        self.assertEqual([error.row for error in report.errors], [2, 3, 4, 5, 6, 7, 8])
+        self.assertEqual(report.errors[0].message, "نام کاربری ali تکراری است.")
+        self.assertEqual(
+            report.errors[3].message, "کاربر teacher وجود دارد و دانش آموز نیست."
+        )
+
+    def test_command_dry_run_and_rejected_file(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "users.csv")
+        rejected = os.path.join(directory.name, "rejected.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=PROVISION_ROW_FIELDS)
+            writer.writeheader()
+            writer.writerows([self.row("ali", "hasan"), self.row("bad", grade="x")])
+
+        out = io.StringIO()
+        call_command(
+            "provision_users",
+            path,
+            "--dry-run",
+            "--workers",
+            "1",
+            stdout=out,
+            stderr=io.StringIO(),
+        )
+        self.assertIn("1 students and 1 parents validated", out.getvalue())
+        self.assertFalse(User.objects.exists())
+
+        call_command(
+            "provision_users",
+            path,
+            "--workers",
+            "1",
+            "--rejected",
+            rejected,
+            stdout=out,
+        )
+        self.assertTrue(User.objects.filter(username="hasan").exists())
+        with open(rejected, newline="", encoding="utf-8-sig") as f:
+            (header, row) = csv.reader(f)
+        self.assertEqual(
+            (row[0], row[1], row[-1]), ("2", "bad", "پایه تحصیلی معتبر نیست.")
+        )
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE, SESSION_ENGINE="django.contrib.sessions.backends.cache"
+)
+class LessonListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher_user = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        )
+        teacher = cls.teacher_user.teachers
+        cls.lessons = Lesson.objects.bulk_create(
+            Lesson(
+                name=f"درس {i}",
+                teacher=teacher,
+                grade="دهم" if i % 2 else "یازدهم",
+                year="1403",
+            )
+            for i in range(30)
+        )
+        cls.ids = sorted((lesson.id for lesson in cls.lessons), reverse=True)
+        student = User.objects.create_user(
+            "student", "password123", is_student=True, is_user=False
+        ).students
+        newest = Lesson.objects.get(id=cls.ids[0])
+        newest.student.add(student)
+        Grade.objects.create(
+            student=student,
+            lesson=newest,
+            month="مهر",
+            score=18,
+            class_activity=15,
+            status="good",
+        )
+
+    def setUp(self):
+        self.client.force_login(self.teacher_user)
+
+    def page(self, **params):
+        response = self.client.get(reverse("account:lessons"), params)
+        context = response.context
+        return [lesson.id for lesson in context["lessons"]], context
+
+    def test_pages_follow_the_id_cursors(self):
+        first, context = self.page()
+        self.assertEqual(first, self.ids[:24])
+        self.assertIsNone(context["newer"])
+        self.assertEqual(context["older"], self.ids[23])
+        lesson = context["lessons"][0]
+        self.assertEqual((lesson.student_count, lesson.grade_count), (1, 1))
+
+        second, context = self.page(before=context["older"])
+        self.assertEqual(second, self.ids[24:])
+        self.assertIsNone(context["older"])
+        self.assertEqual(context["newer"], self.ids[24])
+
+        back, context = self.page(after=context["newer"])
+        self.assertEqual(back, first)
+        self.assertEqual(context["older"], self.ids[23])
+
+    def test_filters_apply_before_the_cursor(self):
+        rows, context = self.page(grade="دهم")
+        self.assertEqual(len(rows), 15)
+        self.assertIsNone(context["older"])
+        self.assertEqual(list(context["grades"]), ["دهم", "یازدهم"])
+
+    def test_other_roles_are_denied(self):
+        self.client.force_login(
+            User.objects.create_user("parent", "password123", is_parents=True)
+        )
+        self.assertEqual(self.client.get(reverse("account:lessons")).status_code, 403)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE, SESSION_ENGINE="django.contrib.sessions.backends.cache"
+)
+class ScoreListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher_user = User.objects.create_user(
+            "teacher", "password123", is_teacher=True, is_user=False
+        )
+        cls.lesson = Lesson.objects.create(
+            name="ریاضی", teacher=cls.teacher_user.teachers, grade="دهم", year="1403"
+        )
+        for username, first_name, month, score, count in (
+            ("ali", "علی", "مهر", 18, 35),
+            ("sara", "سارا", "آبان", 12, 25),
+        ):
+            student = User.objects.create_user(
+                username, "password123", is_student=True, is_user=False
+            ).students
+            student.first_name, student.last_name = first_name, "احمدی"
+            student.save()
+            Grade.objects.bulk_create(
+                Grade(
+                    student=student,
+                    lesson=cls.lesson,
+                    month=month,
+                    score=score,
+                    class_activity=15,
+                    status="good",
+                )
+                for _ in range(count)
+            )
+
+    def setUp(self):
+        self.client.force_login(self.teacher_user)
+        self.addCleanup(caches["default"].clear)
+
+    def get(self, **params):
+        return self.client.get(
+            reverse("account:score_list", args=(self.lesson.id,)), params
+        ).context
+
+    def test_statistics_cover_every_filtered_grade(self):
+        context = self.get()
+        self.assertEqual(len(context["grades"]), 50)
+        stats = context["stats"]
+        self.assertEqual((stats["count"], stats["average"]), (60, 15.5))
+        self.assertEqual(stats["bands"], {"excellent": 35, "good": 0, "average": 25})
+        self.assertEqual(
+            [row["name"] for row in stats["students"]], ["علی احمدی", "سارا احمدی"]
+        )
+        months = {row["month"]: row["count"] for row in stats["months"]}
+        self.assertEqual((months["مهر"], months["آبان"], months["دی"]), (35, 25, 0))
+        self.assertEqual(len(self.get(page=2)["grades"]), 10)
+
+    def test_filters_and_sort(self):
+        stats = self.get(status="average")["stats"]
+        self.assertEqual((stats["count"], stats["highest"]), (25, 12))
+        self.assertEqual(self.get(student="سارا")["stats"]["count"], 25)
+        self.assertEqual(self.get(month="مهر", status="average")["stats"]["count"], 0)
+        self.assertEqual(self.get(sort="score")["grades"][0].score, 12)
+        self.assertEqual(self.get(sort="-score")["grades"][0].score, 18)
+        # the standings of the page are attached to every grade
+        self.assertEqual(self.get()["grades"][0].standing.size, 35)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE, SESSION_ENGINE="django.contrib.sessions.backends.cache"
+)
+class CommentWallTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parent_user = User.objects.create_user(
+            "parent", "password123", is_parents=True, is_user=False
+        )
+        cls.comments = [cls.comment(f"نظر شماره {i}.", show=True) for i in range(14)]
+
+    @classmethod
+    def comment(cls, text, show=False):
+        return Comment.objects.create(
+            user=cls.parent_user.parents,
+            full_name="حسن رضایی",
+            name_st="علی",
+            phone_number="09120000000",
+            comment=text,
+            show=show,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.parent_user)
+        self.addCleanup(caches["default"].clear)
+
+    def wall(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("account:comment"), params)
+        loaded = any("accounts_comment" in query["sql"] for query in queries)
+        return response.content.decode(), loaded
+
+    def test_pages_are_cached(self):
+        content, loaded = self.wall()
+        self.assertTrue(loaded)
+        self.assertIn("نظر شماره 13.", content)
+        self.assertNotIn("نظر شماره 1.", content)
+        self.assertIn(f"?before={self.comments[2].id}", content)
+
+        content, loaded = self.wall()
+        self.assertFalse(loaded)
+        self.assertIn("نظر شماره 13.", content)
+
+        content, loaded = self.wall(before=self.comments[2].id)
+        self.assertTrue(loaded)
+        self.assertIn("نظر شماره 1.", content)
+        self.assertIn(f"?after={self.comments[1].id}", content)
+
+    def test_only_shown_comments_bump_the_version(self):
+        version = comment_wall_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            pending = self.comment("در انتظار تایید")
+        self.assertEqual(comment_wall_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pending.show = True
+            pending.save()
+        self.assertNotEqual(comment_wall_version(), version)
+        self.assertIn("در انتظار تایید", self.wall()[0])
+
+        version = comment_wall_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            pending.show = False
+            pending.save()
+        self.assertNotEqual(comment_wall_version(), version)
+        self.assertNotIn("در انتظار تایید", self.wall()[0])
+
+
+class ScoreValidatorTests(TestCase):
+    def test_non_finite_values_are_invalid(self):
+        for value in (float("nan"), float("inf"), float("-inf")):
+            with self.assertRaises(forms.ValidationError):
+                validate_score(value)
+            with self.assertRaises(forms.ValidationError):
+                validate_class_activity(value)
+
+    def test_range_bounds_are_valid(self):
+        validate_score(0)
+        validate_score(20)
+        validate_class_activity(None)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE, SESSION_ENGINE="django.contrib.sessions.backends.cache"
+)
+class RegisterViewTests(TestCase):
+    data = {
+        "username": "newuser",
+        "full_name": "کاربر جدید",
+        "phone_number": "09120000000",
+        "password1": "password123",
+        "password2": "password123",
+    }
+
+    def test_registration_logs_the_user_in(self):
+        response = self.client.post(reverse("account:register"), self.data)
+        self.assertRedirects(response, reverse("home:main"))
+        user = User.objects.get(username="newuser")
+        self.assertEqual(self.client.session["_auth_user_id"], str(user.pk))
+        self.assertEqual(
+            self.client.session["_auth_user_backend"],
+            "accounts.backends.RoleProfileBackend",
+        )
+        self.assertEqual(NewUser.objects.get(user=user).full_name, "کاربر جدید")
+
+    def test_username_missing_from_a_stale_filter(self):
+        username_index.rebuild()
+        # bulk_create sends no post_save, like a user created by another worker
+        User.objects.bulk_create([User(username="newuser")])
+        self.assertFalse(username_index.is_taken("newuser"))
+
+        response = self.client.post(reverse("account:register"), self.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [str(message) for message in get_messages(response.wsgi_request)],
+            ["نام کاربری رزرو شده است"],
+        )
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, SESSION_CACHE_ALIAS="sessions")
+class SessionStoreTests(TestCase):
+    def setUp(self):
+        # a long delay keeps the background thread away, tests flush by hand
+        self.writer = SessionWriter(3600)
+        patcher = mock.patch("accounts.sessions.writer", self.writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(caches["sessions"].clear)
+
+    def test_writes_of_a_session_are_coalesced(self):
+        session = SessionStore()
+        session["step"] = 1
+        session.save()
+        session["step"] = 2
+        session.save()
+        self.assertFalse(Session.objects.exists())
+
+        with self.assertNumQueries(1):
+            self.writer.flush()
+        stored = Session.objects.get()
+        self.assertEqual(stored.session_key, session.session_key)
+        self.assertEqual(stored.get_decoded(), {"step": 2})
+
+    def test_reads_come_from_the_sessions_cache(self):
+        session = SessionStore()
+        session["step"] = 1
+        session.save()
+        self.assertIsNotNone(caches["sessions"].get(session.cache_key))
+        self.assertIsNone(caches["default"].get(session.cache_key))
+        with self.assertNumQueries(0):
+            self.assertEqual(SessionStore(session.session_key)["step"], 1)
+
+    def test_pending_write_survives_cache_eviction(self):
+        session = SessionStore()
+        session["step"] = 1
+        session.save()
+        caches["sessions"].clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(SessionStore(session.session_key)["step"], 1)
+
+    def test_delete_drops_the_queued_write(self):
+        session = SessionStore()
+        session["step"] = 1
+        session.save()
+        self.writer.flush()
+        session["step"] = 2
+        session.save()
+        session.delete()
+        self.writer.flush()
+        self.assertFalse(Session.objects.exists())
+        self.assertEqual(SessionStore(session.session_key).load(), {})
+
+
+class UsernameIndexTests(TestCase):
+    def test_bloom_filter_membership(self):
+        bloom = BloomFilter(1000)
+        names = [f"user{i}" for i in range(1000)]
+        for name in names:
+            bloom.add(name)
+        self.assertTrue(all(name in bloom for name in names))
+        false_positives = sum(f"other{i}" in bloom for i in range(1000))
+        self.assertLess(false_positives, 50)
+
+    def test_usernames_added_during_a_rebuild_are_kept(self):
+        index = UsernameIndex()
+        values_list = User.objects.values_list
+
+        def read_usernames(*args, **kwargs):
+            index.add("created-meanwhile")
+            return values_list(*args, **kwargs)
+
+        with mock.patch.object(User.objects, "values_list", read_usernames):
+            index.rebuild()
+        self.assertIn("created-meanwhile", index._filter)
@@ -5,18 +5,61 @@ from . import views
 app_name = "account"
 urlpatterns = [
     path("register", views.RegisterView.as_view(), name="register"),
+    path(
+        "register/check-username",
+        views.UsernameAvailabilityView.as_view(),
+        name="username_available",
+    ),
     path("login", views.LoginView.as_view(), name="login"),
     path("change_password", views.ChangePasswordView.as_view(), name="change_password"),
     path("teacher/edit", views.TeacherEdit.as_view(), name="edit_teacher"),
     #   start panel
     path("teacher", views.TeacherProfileView.as_view(), name="teacher_profile"),
+    path("teacher/inbox", views.TeacherInboxView.as_view(), name="teacher_inbox"),
+    path(
+        "teacher/inbox/<int:pk>/read",
+        views.TeacherInboxReadView.as_view(),
+        name="teacher_inbox_read",
+    ),
     path(
         "lesson/<int:pk>", views.AttendanceRecordView.as_view(), name="attendancerecord"
     ),
+    path(
+        "attendance/report",
+        views.AttendanceReportView.as_view(),
+        name="attendance_report",
+    ),
+    path("report-card/<int:pk>", views.ReportCardView.as_view(), name="report_card"),
     path("student", views.StudentPanel.as_view(), name="student_profile"),
     path("parents", views.ParentsPanel.as_view(), name="parents_profile"),
+    path(
+        "parents/history/<int:pk>/<str:kind>",
+        views.ParentsHistoryView.as_view(),
+        name="parents_history",
+    ),
     path("lessons", views.LessonListView.as_view(), name="lessons"),
+    path("score/import", views.GradeImportView.as_view(), name="score_import"),
     path("score/list/<int:pk>", views.ScoreListView.as_view(), name="score_list"),
+    path(
+        "score/distribution/<int:pk>",
+        views.ScoreDistributionView.as_view(),
+        name="score_distribution",
+    ),
+    path(
+        "score/export/lesson/<int:pk>",
+        views.GradeExportView.as_view(scope="lesson"),
+        name="score_export_lesson",
+    ),
+    path(
+        "score/export/teacher",
+        views.GradeExportView.as_view(scope="teacher"),
+        name="score_export_teacher",
+    ),
+    path(
+        "score/export/all",
+        views.GradeExportView.as_view(scope="school"),
+        name="score_export_all",
+    ),
     path(
         "score/update/<int:le>/<int:pk>",
         views.ScoreUpdateView.as_view(),
@@ -0,0 +1,114 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import User
+
+
+class BloomFilter:
+    """
+    fixed size set of strings that answers "maybe present" or "surely
+    absent". false positives happen at roughly `error_rate`, false negatives
+    never do.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size / 8))
+
+    def _positions(self, value):
+        # k positions from two halves of one digest (double hashing)
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+class UsernameIndex:
+    """
+    bloom filter of every username, built from the database on first use and
+    again every `max_age` seconds so users created by other worker processes
+    are picked up too. only a "maybe taken" answer reaches the database.
+
+    the filter of another worker can miss a username for up to `max_age`
+    seconds, so it is only a hint for the availability endpoint. code that
+    creates users must check the database.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._filter = None
+        self._built = 0
+        self._lock = threading.Lock()
+        # only one thread reads the usernames at a time
+        self._rebuild_lock = threading.Lock()
+        # usernames added while a rebuild reads the database, or None
+        self._added = None
+
+    def _stale(self):
+        return self._filter is None or time.monotonic() - self._built > self.max_age
+
+    def rebuild(self):
+        with self._rebuild_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        with self._lock:
+            self._added = []
+        try:
+            usernames = list(User.objects.values_list("username", flat=True))
+            bloom = BloomFilter(max(len(usernames) * 2, 1000))
+            for username in usernames:
+                bloom.add(username)
+        except BaseException:
+            with self._lock:
+                self._added = None
+            raise
+        # merged and swapped under one lock so no add() falls in between
+        with self._lock:
+            for username in self._added:
+                bloom.add(username)
+            self._filter, self._built = bloom, time.monotonic()
+            self._added = None
+
+    def add(self, username):
+        with self._lock:
+            if self._added is not None:
+                self._added.append(username)
+            if self._filter is not None:
+                self._filter.add(username)
+
+    def is_taken(self, username):
+        if self._stale():
+            with self._rebuild_lock:
+                # another request may have rebuilt it while this one waited
+                if self._stale():
+                    self._rebuild()
+        if username not in self._filter:
+            return False
+        return User.objects.filter(username=username).exists()
+
+
+username_index = UsernameIndex()
+
+
+@receiver(post_save, sender=User)
+def add_username(sender, instance, created, **kwargs):
+    if created:
+        username_index.add(instance.username)
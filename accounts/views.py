@@ -7,12 +7,34 @@ from .forms import (
     RegisterForm,
     ScoreUpdateForm,
     ParentCommentForm,
+    GradeImportForm,
+)
+from .services import (
+    ingest_grades,
+    import_grades_csv,
+    stream_grades_csv,
+    stream_grades_jsonl,
+    PanelStats,
+    attach_standings,
 )
 from blog.forms import ArticleForm
 from django.views import View
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Count,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    prefetch_related_objects,
+)
+from django.db.models.functions import Coalesce
+from django.core.paginator import Paginator
+from django.utils.functional import SimpleLazyObject
+from django.urls import reverse
+from urllib.parse import urlencode
 from .models import (
     User,
     Teacher,
@@ -24,13 +46,38 @@ from .models import (
     Parents,
     AttendanceRecord,
     NewUser,
+    StudentSummary,
+    ClassSession,
+    school_today,
+    invalidate_grade_ranks,
+    teacher_panel_version,
+    comment_wall_version,
+    SCHOOL_MONTHS,
+)
+from django.http import (
+    Http404,
+    HttpResponse,
+    StreamingHttpResponse,
+    FileResponse,
+    JsonResponse,
 )
-from django.http import Http404
 from blog.models import Article
 from django.core.exceptions import PermissionDenied
+from django import forms
+import io
+import csv
 import jdatetime
-from django.utils import timezone
-from datetime import datetime
+from .analytics import (
+    attendance_report,
+    score_statistics,
+    term_start,
+    grade_distribution,
+    REPORT_FIELDS,
+    REPORT_LEVELS,
+)
+from .reportcards import get_report_card, pdf_available
+from .middleware import get_role_profile
+from .usernames import username_index
 
 
 class LoginView(View):
@@ -175,7 +222,7 @@ class TeacherEdit(View):
             if user.is_teacher:
 
                 try:
-                    teacher = Teacher.objects.get(user=user)
+                    teacher = get_role_profile(request, Teacher)
                     form = EditTeacherForm(instance=teacher)
                 except Teacher.DoesNotExist:
                     messages.add_message(
@@ -194,7 +241,7 @@ class TeacherEdit(View):
         if user.is_authenticated:
             if user.is_teacher:
                 try:
-                    teacher = Teacher.objects.get(user=user)
+                    teacher = get_role_profile(request, Teacher)
                     form = EditTeacherForm(
                         instance=teacher, data=request.POST, files=request.FILES
                     )
@@ -325,17 +372,73 @@ class TeacherEdit(View):
 #         )
 
 
+def _with_distributions(lessons):
+    lessons = list(lessons)
+    for lesson in lessons:
+        lesson.distribution = grade_distribution(lesson.id)
+    return lessons
+
+
+TEACHER_PANEL_PAGE_SIZE = 10
+TEACHER_PANEL_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _load_rosters(lesson_ids):
+    rosters = {lesson_id: [] for lesson_id in lesson_ids}
+    enrolments = (
+        Lesson.student.through.objects.filter(lesson_id__in=lesson_ids)
+        .select_related("student__user")
+        .order_by("-student_id")
+    )
+    for enrolment in enrolments:
+        rosters[enrolment.lesson_id].append(enrolment.student)
+    return rosters
+
+
+def _with_rosters(lessons):
+    """
+    gives every lesson a lazy `roster`. the students of all the lessons are
+    loaded with one query the first time a roster is read, so a panel served
+    from the fragment cache never loads them.
+    """
+    rosters = SimpleLazyObject(lambda: _load_rosters([l.id for l in lessons]))
+    for lesson in lessons:
+        lesson.roster = SimpleLazyObject(lambda lesson_id=lesson.id: rosters[lesson_id])
+    return lessons
+
+
+def _panel_page(request, name):
+    number = request.GET.get(name, "")
+    return number if number.isdigit() else "1"
+
+
+def _teacher_panel_context(request, teacher):
+    lessons = Lesson.objects.filter(teacher=teacher).annotate(
+        student_count=_count_of(Lesson.student.through, "lesson")
+    )
+    articles = Article.objects.filter(author=request.user)
+    articles_page = _panel_page(request, "articles_page")
+    # صفحه ها فقط وقتی ساخته می شوند که قطعه آن در کش نباشد
+    return {
+        "lessons": _with_rosters(_with_distributions(lessons)),
+        "articles": SimpleLazyObject(
+            lambda: Paginator(articles, TEACHER_PANEL_PAGE_SIZE).get_page(articles_page)
+        ),
+        "inbox": SimpleLazyObject(lambda: _inbox_page(teacher, {})),
+        "articles_page": articles_page,
+        "panel_version": teacher_panel_version(teacher.id),
+        "panel_timeout": TEACHER_PANEL_CACHE_TIMEOUT,
+        "import_form": GradeImportForm(),
+    }
+
+
 class TeacherProfileView(View):
     def get(self, request):
         user = request.user
         if user.is_authenticated:
             if user.is_teacher:
                 try:
-                    articles = Article.objects.filter(author=user)
-                    teacher = Teacher.objects.get(user=user)
-                    lessons = Lesson.objects.filter(teacher=teacher)
-                    teacher_contact = TeacherContact.objects.filter(teacher=teacher)
-
+                    teacher = get_role_profile(request, Teacher)
                 except Teacher.DoesNotExist:
                     messages.add_message(
                         request,
@@ -350,11 +453,7 @@ class TeacherProfileView(View):
         return render(
             request,
             "accounts/teacher_panel.html",
-            {
-                "lessons": lessons,
-                "teacher_contact": teacher_contact,
-                "articles": articles,
-            },
+            _teacher_panel_context(request, teacher),
         )
 
     def post(self, request):
@@ -362,14 +461,12 @@ class TeacherProfileView(View):
         if user.is_authenticated:
             if user.is_teacher:
                 try:
-                    teacher = Teacher.objects.get(user=user)
-                    lessons = Lesson.objects.filter(teacher=teacher)
-                    teacher_contact = TeacherContact.objects.filter(teacher=teacher)
-                    articles = Article.objects.filter(author=user)
+                    teacher = get_role_profile(request, Teacher)
 
                     # دریافت آرایه‌های نمرات از فرم
                     students = request.POST.getlist("students[]")
-                    lesson_names = request.POST.getlist("lessons[]")
+                    # درس ها با شناسه ارسال می شوند، نام درس در پایه های مختلف تکراری است
+                    lesson_ids = request.POST.getlist("lessons[]")
                     scores = request.POST.getlist("scores[]")
                     class_activities = request.POST.getlist("class_activities[]")
                     months = request.POST.getlist("months[]")
@@ -377,58 +474,27 @@ class TeacherProfileView(View):
 
                     # بررسی اینکه آیا فرم نمرات ارسال شده است
                     if students and len(students) > 0:
-                        success_count = 0
-                        error_count = 0
-
-                        # حلقه بر روی تمامی نمرات ارسال شده
-                        for i in range(len(students)):
-                            student = students[i]
-                            lesson_name = lesson_names[i]
-                            score = scores[i]
-                            class_activity = class_activities[i]
-                            month = months[i]
-                            status = statuses[i]
-
-                            # بررسی فیلدهای الزامی
-                            if (
-                                student
-                                and lesson_name
-                                and score
-                                and class_activity
-                                and month
-                                and status
-                            ):
-                                try:
-                                    # پیدا کردن کاربر دانش‌آموز
-                                    user_obj = User.objects.get(username=student)
-                                    student_obj = Student.objects.get(user=user_obj)
-                                    lesson_obj = Lesson.objects.get(
-                                        name=lesson_name, teacher=teacher
-                                    )
-
-                                    # ایجاد نمره جدید
-                                    Grade.objects.create(
-                                        student=student_obj,
-                                        lesson=lesson_obj,
-                                        score=float(score),
-                                        class_activity=float(class_activity),
-                                        month=month,
-                                        status=status,
-                                    )
-                                    success_count += 1
-
-                                except (
-                                    User.DoesNotExist,
-                                    Student.DoesNotExist,
-                                    Lesson.DoesNotExist,
-                                    ValueError,
-                                ) as e:
-                                    error_count += 1
-                                    print(
-                                        f"Error creating grade for student {student}: {str(e)}"
-                                    )
-                            else:
-                                error_count += 1
+                        rows = [
+                            {
+                                "student": student,
+                                "lesson": lesson_id,
+                                "score": score,
+                                "class_activity": class_activity,
+                                "month": month,
+                                "status": status,
+                            }
+                            for student, lesson_id, score, class_activity, month, status in zip(
+                                students,
+                                lesson_ids,
+                                scores,
+                                class_activities,
+                                months,
+                                statuses,
+                            )
+                        ]
+                        report = ingest_grades(rows, teacher=teacher, lesson_field="id")
+                        success_count = report.created
+                        error_count = report.error_count + len(students) - len(rows)
 
                         # نمایش پیام مناسب
                         if success_count > 0:
@@ -443,6 +509,8 @@ class TeacherProfileView(View):
                                 messages.ERROR,
                                 "متاسفانه ثبت نمرات با خطا مواجه شد. لطفا دوباره تلاش کنید.",
                             )
+                        for error in report.errors[:10]:
+                            messages.add_message(request, messages.ERROR, str(error))
 
                         return redirect("account:teacher_profile")
 
@@ -461,25 +529,155 @@ class TeacherProfileView(View):
         return render(
             request,
             "accounts/teacher_panel.html",
-            {
-                "lessons": lessons,
-                "teacher_contact": teacher_contact,
-                "articles": articles,
-            },
+            _teacher_panel_context(request, teacher),
         )
 
 
+def _inbox_page(teacher, params):
+    contacts = TeacherContact.objects.filter(teacher=teacher).select_related("student")
+    query = {}
+    if params.get("unread") == "1":
+        contacts = contacts.filter(is_read=False)
+        query["unread"] = 1
+    rows, older, _ = _keyset_page(contacts, params, TEACHER_PANEL_PAGE_SIZE)
+    next_url = None
+    if older is not None:
+        next_url = f"{reverse('account:teacher_inbox')}?{urlencode({**query, 'before': older})}"
+    return {"teacher_contact": rows, "inbox_next": next_url}
+
+
+class TeacherInboxView(View):
+    def get(self, request):
+        user = request.user
+        if not user.is_authenticated or not user.is_teacher:
+            raise Http404()
+        try:
+            teacher = get_role_profile(request, Teacher)
+        except Teacher.DoesNotExist:
+            raise Http404()
+
+        inbox = _inbox_page(teacher, request.GET)
+        response = render(request, "accounts/includes/teacher_inbox.html", inbox)
+        if inbox["inbox_next"] is not None:
+            response["X-Next-Url"] = inbox["inbox_next"]
+        return response
+
+
+class TeacherInboxReadView(View):
+    def post(self, request, pk):
+        user = request.user
+        if not user.is_authenticated or not user.is_teacher:
+            raise Http404()
+        try:
+            teacher = get_role_profile(request, Teacher)
+        except Teacher.DoesNotExist:
+            raise Http404()
+
+        TeacherContact.objects.mark_read(teacher, [pk])
+        teacher.refresh_from_db(fields=["unread_messages"])
+        return JsonResponse({"unread": teacher.unread_messages})
+
+
+class GradeImportView(View):
+    def post(self, request):
+        user = request.user
+        if not user.is_authenticated or not user.is_teacher:
+            raise Http404()
+
+        try:
+            teacher = get_role_profile(request, Teacher)
+        except Teacher.DoesNotExist:
+            raise Http404()
+        if not teacher.status:
+            raise PermissionDenied()
+
+        form = GradeImportForm(request.POST, request.FILES)
+        if not form.is_valid():
+            messages.add_message(
+                request, messages.ERROR, "تمامی قسمت ها باید به درستی پر شوند."
+            )
+            return redirect("account:teacher_profile")
+
+        cd = form.cleaned_data
+        created = 0
+        errors = []
+        error_count = 0
+        try:
+            f = io.TextIOWrapper(cd["file"].file, encoding="utf-8-sig", newline="")
+            for report in import_grades_csv(f, teacher=teacher, dry_run=cd["dry_run"]):
+                created += report.created
+                error_count += report.error_count
+                errors.extend(report.errors[: 10 - len(errors)])
+        except forms.ValidationError as e:
+            messages.add_message(request, messages.ERROR, " ".join(e.messages))
+            return redirect("account:teacher_profile")
+        except UnicodeDecodeError:
+            messages.add_message(
+                request, messages.ERROR, "فایل باید با کدگذاری UTF-8 ذخیره شده باشد."
+            )
+            return redirect("account:teacher_profile")
+
+        if cd["dry_run"]:
+            messages.add_message(
+                request,
+                messages.INFO,
+                f"{created} ردیف معتبر است. {error_count} ردیف خطا دارد.",
+            )
+        elif created > 0:
+            messages.add_message(
+                request,
+                messages.SUCCESS,
+                f"{created} نمره با موفقیت ثبت شد. {error_count} نمره با خطا مواجه شد.",
+            )
+        else:
+            messages.add_message(
+                request,
+                messages.ERROR,
+                "متاسفانه ثبت نمرات با خطا مواجه شد. لطفا دوباره تلاش کنید.",
+            )
+        for error in errors:
+            messages.add_message(request, messages.ERROR, str(error))
+
+        return redirect("account:teacher_profile")
+
+
+COMMENT_PAGE_SIZE = 12
+COMMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _comment_wall_context(request):
+    comments = Comment.objects.filter(show=True).select_related("user")
+    cursor = {
+        name: request.GET[name]
+        for name in ("before", "after")
+        if request.GET.get(name, "").isdigit()
+    }
+    return {
+        # فقط وقتی صفحه در کش نیست از پایگاه داده خوانده می شود
+        "wall": SimpleLazyObject(
+            lambda: dict(
+                zip(
+                    ("comments", "older", "newer"),
+                    _keyset_page(comments, cursor, COMMENT_PAGE_SIZE),
+                )
+            )
+        ),
+        "wall_cursor": urlencode(cursor),
+        "wall_version": comment_wall_version(),
+        "wall_timeout": COMMENT_CACHE_TIMEOUT,
+    }
+
+
 class CommentView(View):
     def get(self, request):
         user = request.user
         if user.is_authenticated:
             if user.is_parents:
                 form = ParentCommentForm()
-                comments = Comment.objects.filter(show=True)
                 return render(
                     request,
                     "accounts/comment.html",
-                    {"form": form, "comments": comments},
+                    {"form": form, **_comment_wall_context(request)},
                 )
             else:
                 messages.add_message(
@@ -518,7 +716,11 @@ class CommentView(View):
             )
             return redirect("account:login")
 
-        return render(request, "accounts/comment.html", {"form": form})
+        return render(
+            request,
+            "accounts/comment.html",
+            {"form": form, **_comment_wall_context(request)},
+        )
 
 
 class StudentPanel(View):
@@ -527,11 +729,14 @@ class StudentPanel(View):
         if user.is_authenticated:
             if user.is_student:
                 try:
-                    student = Student.objects.get(user=user)
+                    student = get_role_profile(request, Student)
+                    PanelStats.for_request(request).prefetch([student])
                     attendancerecords = AttendanceRecord.objects.filter(
                         student=student
                     )[:5]
-                    grades = Grade.objects.filter(student=student)
+                    grades = attach_standings(
+                        Grade.objects.filter(student=student).select_related("lesson")
+                    )
                     return render(
                         request,
                         "accounts/student_panel.html",
@@ -565,13 +770,44 @@ class StudentPanel(View):
             return Http404()
 
 
+PARENTS_HISTORY_SIZE = 10
+
+
+def _recent_history(queryset):
+    # یک ردیف بیشتر برای فهمیدن اینکه سابقه قبلی وجود دارد یا نه
+    return queryset.select_related("lesson").order_by("-id")[: PARENTS_HISTORY_SIZE + 1]
+
+
+def _trim_history(rows):
+    if len(rows) > PARENTS_HISTORY_SIZE:
+        rows = rows[:PARENTS_HISTORY_SIZE]
+        return rows, rows[-1].id
+    return rows, None
+
+
 class ParentsPanel(View):
     def get(self, request):
         user = request.user
         if user.is_authenticated:
             if user.is_parents:
                 try:
-                    parent = Parents.objects.get(user=user)
+                    children = Student.objects.prefetch_related(
+                        Prefetch(
+                            "grades",
+                            queryset=_recent_history(Grade.objects.all()),
+                            to_attr="recent_grades",
+                        ),
+                        Prefetch(
+                            "attendancerecords",
+                            queryset=_recent_history(AttendanceRecord.objects.all()),
+                            to_attr="recent_attendancerecords",
+                        ),
+                    )
+                    parent = get_role_profile(request, Parents)
+                    prefetch_related_objects(
+                        [parent],
+                        Prefetch("child", queryset=children, to_attr="children"),
+                    )
                 except Parents.DoesNotExist:
                     messages.add_message(
                         request,
@@ -584,7 +820,94 @@ class ParentsPanel(View):
         else:
             raise Http404()
 
-        return render(request, "accounts/parents_panel.html", {"parent": parent})
+        for child in parent.children:
+            child.recent_grades, child.grades_before = _trim_history(
+                child.recent_grades
+            )
+            child.recent_attendancerecords, child.attendancerecords_before = (
+                _trim_history(child.recent_attendancerecords)
+            )
+        PanelStats.for_request(request).prefetch(parent.children)
+
+        return render(
+            request,
+            "accounts/parents_panel.html",
+            {"parent": parent, "children": parent.children},
+        )
+
+
+class ParentsHistoryView(View):
+    kinds = {
+        "grades": (Grade, "accounts/includes/parents_grade_rows.html", "grades"),
+        "attendance": (
+            AttendanceRecord,
+            "accounts/includes/parents_attendance_rows.html",
+            "attendancerecords",
+        ),
+    }
+
+    def get(self, request, pk, kind):
+        user = request.user
+        if not user.is_authenticated or not user.is_parents:
+            raise Http404()
+        if kind not in self.kinds:
+            raise Http404()
+        if not Student.objects.filter(id=pk, parents__user=user).exists():
+            raise Http404()
+
+        model, template_name, context_name = self.kinds[kind]
+        rows = model.objects.filter(student_id=pk)
+        before = request.GET.get("before", "")
+        if before.isdigit():
+            rows = rows.filter(id__lt=int(before))
+        rows, next_before = _trim_history(list(_recent_history(rows)))
+
+        response = render(request, template_name, {context_name: rows})
+        if next_before is not None:
+            response["X-Next-Url"] = (
+                f"{reverse('account:parents_history', args=(pk, kind))}"
+                f"?before={next_before}"
+            )
+        return response
+
+
+LESSON_PAGE_SIZE = 24
+
+
+def _keyset_page(queryset, params, size):
+    """
+    one page of a newest first queryset, cut at the `before` or `after` id
+    of the query string instead of an offset. returns the rows with the
+    cursors of the older and the newer page (None when there is none).
+    """
+    before, after = params.get("before", ""), params.get("after", "")
+    if after.isdigit():
+        rows = list(queryset.filter(id__gt=after).order_by("id")[: size + 1])
+        newer = rows[size - 1].id if len(rows) > size else None
+        rows = rows[:size][::-1]
+        older = rows[-1].id if rows else None
+    else:
+        if before.isdigit():
+            queryset = queryset.filter(id__lt=before)
+        rows = list(queryset.order_by("-id")[: size + 1])
+        older = rows[size - 1].id if len(rows) > size else None
+        rows = rows[:size]
+        newer = rows[0].id if rows and before.isdigit() else None
+    return rows, older, newer
+
+
+def _count_of(model, field):
+    # correlated count, only evaluated for the rows of the page
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("*"))
+            .values("count")
+        ),
+        0,
+    )
 
 
 class LessonListView(View):
@@ -594,7 +917,9 @@ class LessonListView(View):
             if user.is_superuser:
                 lessons = Lesson.objects.all()
             elif user.is_teacher:
-                lessons = Lesson.objects.filter(teacher=user.teachers)
+                lessons = Lesson.objects.filter(
+                    teacher=get_role_profile(request, Teacher)
+                )
             else:
                 messages.add_message(
                     request, messages.WARNING, "شما به این بخش دسترسی ندارید"
@@ -605,7 +930,78 @@ class LessonListView(View):
                 request, messages.WARNING, "برای دسترسی به صفحه باید وارد شوید"
             )
             return redirect("account:login")
-        return render(request, "accounts/lesson_list.html", {"lessons": lessons})
+
+        years = lessons.order_by("-year").values_list("year", flat=True).distinct()
+        grades = lessons.order_by("grade").values_list("grade", flat=True).distinct()
+        teachers = Teacher.objects.order_by("full_name") if user.is_superuser else None
+        filters = {
+            "teacher": request.GET.get("teacher", ""),
+            "year": request.GET.get("year", ""),
+            "grade": request.GET.get("grade", ""),
+        }
+        if user.is_superuser and filters["teacher"].isdigit():
+            lessons = lessons.filter(teacher_id=filters["teacher"])
+        if filters["year"]:
+            lessons = lessons.filter(year=filters["year"])
+        if filters["grade"]:
+            lessons = lessons.filter(grade=filters["grade"])
+
+        lessons = lessons.select_related("teacher").annotate(
+            student_count=_count_of(Lesson.student.through, "lesson"),
+            grade_count=_count_of(Grade, "lesson"),
+        )
+        lessons, older, newer = _keyset_page(lessons, request.GET, LESSON_PAGE_SIZE)
+        return render(
+            request,
+            "accounts/lesson_list.html",
+            {
+                "lessons": lessons,
+                "older": older,
+                "newer": newer,
+                "years": years,
+                "grades": grades,
+                "teachers": teachers,
+                "filters": filters,
+            },
+        )
+
+
+SCORE_PAGE_SIZE = 50
+# همان بازه هایی که ستون وضعیت جدول نمرات نشان می دهد
+SCORE_STATUS = {
+    "excellent": {"score__gte": 17},
+    "good": {"score__gte": 14, "score__lt": 17},
+    "average": {"score__lt": 14},
+}
+SCORE_SORTS = {
+    "": ("-month", "-id"),
+    "-score": ("-score", "-id"),
+    "score": ("score", "id"),
+    "student": ("student__last_name", "student__first_name", "id"),
+}
+
+
+def _filter_scores(grades, params):
+    """
+    apply the month, status and student filters of the score list to
+    `grades`. returns the filtered grades and the filter values.
+    """
+    filters = {
+        "month": params.get("month", ""),
+        "status": params.get("status", ""),
+        "student": params.get("student", "").strip(),
+        "sort": params.get("sort", ""),
+    }
+    if filters["month"] in Grade.months:
+        grades = grades.filter(month=filters["month"])
+    if filters["status"] in SCORE_STATUS:
+        grades = grades.filter(**SCORE_STATUS[filters["status"]])
+    if name := filters["student"]:
+        grades = grades.filter(
+            Q(student__first_name__icontains=name)
+            | Q(student__last_name__icontains=name)
+        )
+    return grades, filters
 
 
 class ScoreListView(View):
@@ -620,7 +1016,7 @@ class ScoreListView(View):
                     raise Http404()
             elif user.is_teacher:
                 try:
-                    teacher = Teacher.objects.get(user=user)
+                    teacher = get_role_profile(request, Teacher)
                     lesson = Lesson.objects.get(id=pk, teacher=teacher)
                     grades = Grade.objects.filter(lesson=lesson)
                 except (Lesson.DoesNotExist, Teacher.DoesNotExist):
@@ -630,18 +1026,124 @@ class ScoreListView(View):
                 raise PermissionDenied()
         else:
             raise Http404()
+
+        grades, filters = _filter_scores(grades, request.GET)
+        # the cards and charts cover every filtered grade, not only the page
+        stats = score_statistics(grades, SCORE_STATUS)
+        grades = grades.select_related("student", "lesson").order_by(
+            *SCORE_SORTS.get(filters["sort"], SCORE_SORTS[""])
+        )
+
+        page = Paginator(grades, SCORE_PAGE_SIZE).get_page(request.GET.get("page"))
         return render(
-            request, "accounts/score_list.html", {"lesson": lesson, "grades": grades}
+            request,
+            "accounts/score_list.html",
+            {
+                "lesson": lesson,
+                "page": page,
+                "grades": attach_standings(page),
+                "filters": filters,
+                "months": SCHOOL_MONTHS,
+                "stats": stats,
+                "distribution": grade_distribution(lesson.id),
+            },
         )
 
 
+class ScoreDistributionView(View):
+    def get(self, request, pk):
+        user = request.user
+        if not user.is_authenticated:
+            raise Http404()
+        if user.is_superuser:
+            lessons = Lesson.objects.filter(id=pk)
+        elif user.is_teacher:
+            lessons = Lesson.objects.filter(id=pk, teacher__user=user)
+        else:
+            raise PermissionDenied()
+        if not lessons.exists():
+            raise Http404()
+        return JsonResponse(
+            grade_distribution(pk), json_dumps_params={"ensure_ascii": False}
+        )
+
+
+class GradeExportView(View):
+    """
+    stream the grades of a lesson, of the teacher or of the whole school. the
+    lesson export takes the filters of the score list, and its `print`
+    format renders them as a printable page for saving as pdf.
+    """
+
+    scope = "lesson"
+    formats = {
+        "csv": (stream_grades_csv, "text/csv; charset=utf-8"),
+        "jsonl": (stream_grades_jsonl, "application/x-ndjson; charset=utf-8"),
+    }
+
+    def get(self, request, pk=None):
+        user = request.user
+        if not user.is_authenticated:
+            raise Http404()
+
+        fmt = request.GET.get("format", "csv")
+        if fmt not in self.formats and not (fmt == "print" and self.scope == "lesson"):
+            raise Http404()
+
+        if self.scope == "lesson":
+            try:
+                if user.is_superuser:
+                    lesson = Lesson.objects.get(id=pk)
+                elif user.is_teacher:
+                    lesson = Lesson.objects.get(id=pk, teacher__user=user)
+                else:
+                    raise PermissionDenied()
+            except Lesson.DoesNotExist:
+                raise Http404()
+            grades, filters = _filter_scores(
+                Grade.objects.filter(lesson=lesson), request.GET
+            )
+            filename = f"grades-lesson-{lesson.id}"
+            if fmt == "print":
+                return render(
+                    request,
+                    "accounts/score_print.html",
+                    {
+                        "lesson": lesson,
+                        "filters": filters,
+                        "stats": score_statistics(grades, SCORE_STATUS),
+                        "grades": grades.select_related("student").order_by(
+                            *SCORE_SORTS.get(filters["sort"], SCORE_SORTS[""])
+                        ),
+                        "date": school_today(),
+                    },
+                )
+        elif self.scope == "teacher":
+            if not user.is_teacher:
+                raise PermissionDenied()
+            grades = Grade.objects.filter(lesson__teacher__user=user)
+            filename = f"grades-{user.username}"
+        else:
+            if not user.is_superuser:
+                raise PermissionDenied()
+            grades = Grade.objects.all()
+            filename = "grades"
+
+        stream, content_type = self.formats[fmt]
+        response = StreamingHttpResponse(stream(grades), content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+        return response
+
+
 class ScoreUpdateView(View):
     def get(self, request, pk, le):
         user = request.user
         if user.is_authenticated:
             if user.is_teacher:
                 try:
-                    lesson = Lesson.objects.get(id=le, teacher=user.teachers)
+                    lesson = Lesson.objects.get(
+                        id=le, teacher=get_role_profile(request, Teacher)
+                    )
                     grade = Grade.objects.get(id=pk, lesson=lesson)
                     form = ScoreUpdateForm(instance=grade)
                 except (Grade.DoesNotExist, Lesson.DoesNotExist):
@@ -661,11 +1163,16 @@ class ScoreUpdateView(View):
         if user.is_authenticated:
             if user.is_teacher:
                 try:
-                    lesson = Lesson.objects.get(id=le, teacher=user.teachers)
+                    lesson = Lesson.objects.get(
+                        id=le, teacher=get_role_profile(request, Teacher)
+                    )
                     grade = Grade.objects.get(id=pk, lesson=lesson)
+                    # اگر ماه نمره عوض شود رتبه های ماه قبلی هم باید دوباره حساب شوند
+                    previous = (grade.lesson_id, grade.month)
                     form = ScoreUpdateForm(request.POST, instance=grade)
                     if form.is_valid():
                         form.save()
+                        invalidate_grade_ranks([previous])
                         messages.add_message(
                             request,
                             messages.SUCCESS,
@@ -691,7 +1198,9 @@ class ScoreDeleteView(View):
         if user.is_authenticated:
             if user.is_teacher:
                 try:
-                    lesson = Lesson.objects.get(id=le, teacher=user.teachers)
+                    lesson = Lesson.objects.get(
+                        id=le, teacher=get_role_profile(request, Teacher)
+                    )
                     grade = Grade.objects.get(id=pk, lesson=lesson)
                     grade.delete()
                     messages.add_message(
@@ -719,17 +1228,30 @@ class RegisterView(View):
         form = RegisterForm(request.POST)
         if form.is_valid():
             cd = form.cleaned_data
+            # the bloom filter of other workers may be minutes old, so the
+            # form checks the database itself
             if User.objects.filter(username=cd["username"]).exists():
                 messages.add_message(request, messages.INFO, "نام کاربری رزرو شده است")
             else:
                 if cd["password1"] == cd["password2"]:
-                    user = User.objects.create_user(
-                        username=cd["username"], password=cd["password1"]
-                    )
-                    NewUser.objects.filter(user=user).update(
-                        full_name=cd["full_name"], phone_number=cd["phone_number"]
-                    )
-                    login(request, user)
+                    try:
+                        with transaction.atomic():
+                            user = User.objects.create_user(
+                                username=cd["username"], password=cd["password1"]
+                            )
+                            NewUser.objects.filter(user=user).update(
+                                full_name=cd["full_name"],
+                                phone_number=cd["phone_number"],
+                            )
+                    except IntegrityError:
+                        # taken by another request since the check above
+                        messages.add_message(
+                            request, messages.INFO, "نام کاربری رزرو شده است"
+                        )
+                        return render(request, "accounts/register.html", {"form": form})
+                    # the user does not come from authenticate(), so login()
+                    # has to be told which of the backends to store
+                    login(request, user, backend="accounts.backends.RoleProfileBackend")
                     request.session.set_expiry(604800)
                     request.session["remember_me"] = True
                     messages.add_message(
@@ -749,6 +1271,31 @@ class RegisterView(View):
         return render(request, "accounts/register.html", {"form": form})
 
 
+class UsernameAvailabilityView(View):
+    def get(self, request):
+        username = request.GET.get("username", "").strip()
+        if not username:
+            return JsonResponse(
+                {
+                    "username": username,
+                    "available": False,
+                    "message": "نام کاربری را وارد کنید",
+                },
+                json_dumps_params={"ensure_ascii": False},
+            )
+        available = not username_index.is_taken(username)
+        return JsonResponse(
+            {
+                "username": username,
+                "available": available,
+                "message": (
+                    "نام کاربری آزاد است" if available else "نام کاربری رزرو شده است"
+                ),
+            },
+            json_dumps_params={"ensure_ascii": False},
+        )
+
+
 def user_logout(request):
     if request.user.is_authenticated:
         logout(request)
@@ -762,6 +1309,14 @@ def user_logout(request):
         return redirect("account:login")
 
 
+def _session_period(value):
+    try:
+        period = int(value)
+    except (TypeError, ValueError):
+        return 1
+    return period if period in ClassSession.periods else 1
+
+
 class AttendanceRecordView(View):
 
     def get(self, request, pk):
@@ -770,50 +1325,28 @@ class AttendanceRecordView(View):
             raise Http404()
 
         try:
-            lesson = Lesson.objects.get(id=pk, teacher=user.teachers)
+            lesson = Lesson.objects.get(
+                id=pk, teacher=get_role_profile(request, Teacher)
+            )
             students = lesson.student.all().order_by("last_name")
+            period = _session_period(request.GET.get("period"))
 
             # تاریخ جلالی امروز برای نمایش
-            today_jalali = jdatetime.datetime.now().date()
-            today_jalali_str = today_jalali.strftime("%Y/%m/%d")
+            today = school_today()
+            today_jalali_str = today.strftime("%Y/%m/%d")
 
-            # تاریخ میلادی امروز برای کوئری
-            today_gregorian = jdatetime.date.today().togregorian()
-
-            try:
-                existing_records = AttendanceRecord.objects.filter(
-                    lesson=lesson, created_date__date=today_gregorian
-                ).select_related("student")
-            except:
-                # روش 2: روش جایگزین برای دیتابیس‌هایی که __date را پشتیبانی نمی‌کنند
-                start_of_day = datetime.combine(today_gregorian, datetime.min.time())
-                end_of_day = datetime.combine(today_gregorian, datetime.max.time())
-
-                # اگر از timezone استفاده می‌کنید:
-                if timezone.is_aware(start_of_day):
-                    start_of_day = timezone.make_aware(start_of_day)
-                    end_of_day = timezone.make_aware(end_of_day)
-
-                existing_records = AttendanceRecord.objects.filter(
-                    lesson=lesson,
-                    created_date__gte=start_of_day,
-                    created_date__lte=end_of_day,
-                ).select_related("student")
+            existing_records = AttendanceRecord.objects.filter(
+                session__lesson=lesson, session__date=today, session__period=period
+            )
 
             # ایجاد دیکشنری برای وضعیت‌های امروز
             status_dict = {}
             for record in existing_records:
-                # تبدیل تاریخ میلادی به جلالی برای نمایش
-                jalali_date = jdatetime.datetime.fromgregorian(
-                    datetime=record.created_date
-                ).strftime("%Y/%m/%d")
-
-                status_dict[record.student.id] = {
+                status_dict[record.student_id] = {
                     "record": record,
                     "status": record.status,
                     "created_date": record.created_date,
-                    "jalali_date": jalali_date,
-                    "time": record.created_date.strftime("%H:%M"),  # ساعت
+                    "jalali_date": record.created_date.strftime("%Y/%m/%d"),
                 }
 
             return render(
@@ -824,6 +1357,8 @@ class AttendanceRecordView(View):
                     "students": students,
                     "existing_records": status_dict,
                     "today_jalali": today_jalali_str,
+                    "period": period,
+                    "periods": ClassSession.periods,
                 },
             )
         except Lesson.DoesNotExist:
@@ -838,72 +1373,161 @@ class AttendanceRecordView(View):
             raise Http404()
 
         try:
-            lesson = Lesson.objects.get(id=pk, teacher=user.teachers)
-            students = lesson.student.all()
-
-            # تاریخ‌های امروز
-            today_jalali = jdatetime.datetime.now().date()
-            today_jalali_str = today_jalali.strftime("%Y/%m/%d")
-            today_gregorian = jdatetime.date.today().togregorian()
-
-            # محاسبه شروع و پایان امروز برای کوئری
-            start_of_day = datetime.combine(today_gregorian, datetime.min.time())
-            end_of_day = datetime.combine(today_gregorian, datetime.max.time())
+            lesson = Lesson.objects.get(
+                id=pk, teacher=get_role_profile(request, Teacher)
+            )
+            period = _session_period(request.POST.get("period"))
 
-            if timezone.is_aware(start_of_day):
-                start_of_day = timezone.make_aware(start_of_day)
-                end_of_day = timezone.make_aware(end_of_day)
+            # وضعیت‌های ارسال شده برای دانش‌آموزان این درس
+            statuses = {}
+            for student_id in lesson.student.values_list("id", flat=True):
+                status = request.POST.get(f"attendance_{student_id}")
+                if status in AttendanceRecord.sta:
+                    statuses[student_id] = status
 
             with transaction.atomic():
-                saved_count = 0
-                updated_count = 0
-
-                for student in students:
-                    field_name = f"attendance_{student.id}"
-                    status = request.POST.get(field_name)
-
-                    if status and status in ["present", "absent", "late"]:
-                        # بررسی آیا رکورد امروز وجود دارد؟
-                        existing_record = AttendanceRecord.objects.filter(
-                            student=student,
-                            lesson=lesson,
-                            created_date__gte=start_of_day,
-                            created_date__lte=end_of_day,
-                        ).first()
-
-                        if existing_record:
-                            # به‌روزرسانی رکورد موجود
-                            existing_record.status = status
-                            existing_record.save()
-                            updated_count += 1
-                        else:
-                            # ایجاد رکورد جدید
-                            # اگر created_date auto_now_add=True دارد، خودش پر می‌شود
-                            AttendanceRecord.objects.create(
-                                student=student,
+                session = ClassSession.objects.today(lesson, period)
+                today_jalali_str = session.date.strftime("%Y/%m/%d")
+
+                # رکوردهای این جلسه با یک کوئری
+                existing_records = {
+                    record.student_id: record
+                    for record in AttendanceRecord.objects.filter(
+                        session=session, student_id__in=statuses
+                    )
+                }
+                new_records = []
+                changed_records = []
+                for student_id, status in statuses.items():
+                    record = existing_records.get(student_id)
+                    if record is None:
+                        new_records.append(
+                            AttendanceRecord(
+                                student_id=student_id,
                                 lesson=lesson,
+                                session=session,
                                 status=status,
-                                # created_date به صورت خودکار پر می‌شود اگر auto_now_add=True باشد
                             )
-                            saved_count += 1
+                        )
+                    elif record.status != status:
+                        record.status = status
+                        changed_records.append(record)
+
+                # ارسال دوباره فرم به جای رکورد تکراری، رکورد موجود را به‌روز می‌کند
+                AttendanceRecord.objects.bulk_create(
+                    new_records,
+                    update_conflicts=True,
+                    unique_fields=["session", "student"],
+                    update_fields=["status"],
+                )
+                AttendanceRecord.objects.bulk_update(changed_records, ["status"])
+                StudentSummary.objects.refresh(
+                    [record.student_id for record in new_records + changed_records]
+                )
+                saved_count = len(new_records)
+                updated_count = len(changed_records)
 
                 # پیام موفقیت
-                if saved_count > 0 or updated_count > 0:
+                if statuses:
                     message_parts = []
                     if saved_count > 0:
                         message_parts.append(f"{saved_count} رکورد جدید")
                     if updated_count > 0:
                         message_parts.append(f"{updated_count} رکورد به‌روزرسانی")
+                    if not message_parts:
+                        message_parts.append("بدون تغییر")
 
                     message = f'✅ حضور و غیاب تاریخ {today_jalali_str} با موفقیت ثبت شد. ({", ".join(message_parts)})'
                     messages.success(request, message)
                 else:
                     messages.warning(request, "⚠️ هیچ وضعیتی انتخاب نشده بود.")
 
-                return redirect("account:attendancerecord", pk)
+                return redirect(
+                    f"{reverse('account:attendancerecord', args=(pk,))}?period={period}"
+                )
 
         except Lesson.DoesNotExist:
             raise Http404()
         except Exception as e:
             messages.error(request, f"❌ خطا در ذخیره‌سازی: {str(e)}")
             return redirect("account:attendancerecord", pk)
+
+
+def _parse_jalali_date(value):
+    try:
+        return jdatetime.datetime.strptime(
+            (value or "").replace("/", "-"), "%Y-%m-%d"
+        ).date()
+    except ValueError:
+        return None
+
+
+class AttendanceReportView(View):
+    def get(self, request):
+        user = request.user
+        if not user.is_authenticated:
+            raise Http404()
+        if not (user.is_staff or user.is_superuser):
+            raise PermissionDenied()
+
+        start = _parse_jalali_date(request.GET.get("start")) or term_start()
+        end = _parse_jalali_date(request.GET.get("end")) or school_today()
+        report = attendance_report(start, end)
+
+        if request.GET.get("format") == "csv":
+            level = request.GET.get("level", "student")
+            if level not in REPORT_LEVELS:
+                raise Http404()
+            response = HttpResponse(content_type="text/csv; charset=utf-8")
+            response["Content-Disposition"] = (
+                f'attachment; filename="attendance-{level}-{start}-{end}.csv"'
+            )
+            response.write("\ufeff")
+            writer = csv.DictWriter(response, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(report[level])
+            return response
+
+        return render(
+            request,
+            "accounts/attendance_report.html",
+            {
+                "report": report,
+                "start": start.strftime("%Y-%m-%d"),
+                "end": end.strftime("%Y-%m-%d"),
+            },
+        )
+
+
+class ReportCardView(View):
+    def get(self, request, pk):
+        user = request.user
+        if not user.is_authenticated:
+            raise Http404()
+
+        students = Student.objects.filter(id=pk)
+        if not user.is_superuser:
+            if user.is_student:
+                students = students.filter(user=user)
+            elif user.is_parents:
+                students = students.filter(parents__user=user)
+            elif user.is_teacher:
+                students = students.filter(lessons__teacher__user=user)
+            else:
+                raise PermissionDenied()
+        student = students.first()
+        if student is None:
+            raise Http404()
+
+        pdf = request.GET.get("format") == "pdf"
+        if pdf and not pdf_available():
+            raise Http404()
+        path = get_report_card(student, pdf=pdf)
+        if pdf:
+            return FileResponse(
+                open(path, "rb"),
+                as_attachment=True,
+                filename=f"report-card-{student.user.username}.pdf",
+                content_type="application/pdf",
+            )
+        return FileResponse(open(path, "rb"), content_type="text/html; charset=utf-8")
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django_summernote.admin import SummernoteModelAdmin
+from home.admin import VisitorsAdminMixin
 from . import models
 
 
@@ -18,13 +19,15 @@ class CommentsAdmin(admin.ModelAdmin):
     search_fields = ("title", "email")
 
 
-class ArticleAdmin(SummernoteModelAdmin):
+class ArticleAdmin(VisitorsAdminMixin, SummernoteModelAdmin):
     summernote_fields = ("content",)
     list_display = (
         "title",
         "author",
         "status",
         "views",
+        "visitors_week",
+        "visitors_month",
         "created_date",
         "updated_date",
     )
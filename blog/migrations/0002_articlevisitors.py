@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:49
+
+import django.db.models.deletion
+import django_jalali.db.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArticleVisitors",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", django_jalali.db.models.jDateField(verbose_name="روز")),
+                ("sketch", models.BinaryField(verbose_name="بازدیدکنندگان")),
+                (
+                    "article",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="visitor_sketches",
+                        to="blog.article",
+                        verbose_name="مقاله",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "بازدیدکنندگان مقاله",
+                "verbose_name_plural": "بازدیدکنندگان مقاله ها",
+                "ordering": ("-date",),
+                "abstract": False,
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("article", "date"),
+                        name="unique_article_visitors_per_day",
+                    )
+                ],
+            },
+        ),
+    ]
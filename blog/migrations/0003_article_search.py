@@ -0,0 +1,25 @@
+from django.db import migrations
+
+from home.search import SearchIndex
+
+# frozen copy of article_index in blog/models.py
+article_index = SearchIndex(
+    "blog_article_fts", ("title", "subject", "content"), html=("content",)
+)
+
+
+def index_article(apps, schema_editor):
+    Article = apps.get_model("blog", "Article")
+    article_index.rebuild(Article.objects.using(schema_editor.connection.alias))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0002_articlevisitors"),
+    ]
+
+    operations = [
+        migrations.RunSQL(article_index.create_sql(), article_index.drop_sql()),
+        migrations.RunPython(index_article, migrations.RunPython.noop),
+    ]
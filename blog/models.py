@@ -1,6 +1,10 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django_jalali.db import models as jmodels
+from home.models import VisitorSketch
+from home.search import SearchIndex
 
 
 User = get_user_model()
@@ -37,6 +41,26 @@ class Article(models.Model):
         return self.title
 
 
+class ArticleVisitors(VisitorSketch):
+    target_field = "article"
+
+    article = models.ForeignKey(
+        Article,
+        on_delete=models.CASCADE,
+        related_name="visitor_sketches",
+        verbose_name="مقاله",
+    )
+
+    class Meta(VisitorSketch.Meta):
+        verbose_name = "بازدیدکنندگان مقاله"
+        verbose_name_plural = "بازدیدکنندگان مقاله ها"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["article", "date"], name="unique_article_visitors_per_day"
+            )
+        ]
+
+
 class Category(models.Model):
     title = models.CharField(unique=True, max_length=250, verbose_name="عنوان")
 
@@ -79,3 +103,23 @@ class Comments(models.Model):
 
     def __str__(self):
         return self.name
+
+
+article_index = SearchIndex(
+    "blog_article_fts",
+    ("title", "subject", "content"),
+    html=("content",),
+    weights=(10.0, 5.0, 1.0),
+)
+
+
+@receiver(post_save, sender=Article)
+def index_article(sender, instance, using, update_fields, **kwargs):
+    if update_fields and not update_fields & set(article_index.columns):
+        return
+    article_index.update([instance], using)
+
+
+@receiver(post_delete, sender=Article)
+def unindex_article(sender, instance, using, **kwargs):
+    article_index.delete([instance.pk], using)
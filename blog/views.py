@@ -3,15 +3,16 @@ from django.views import View
 from .forms import ArticleForm, ArticleUpdateForm, CommentForm
 from django.http import Http404
 from django.contrib import messages
-from .models import Article, Comments
+from .models import Article, Comments, article_index
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
+from home.counters import view_counter, visitor_id
 
 
 class BlogView(View):
     def get(self, request):
         articles = Article.objects.filter(status=True)
         if s := request.GET.get("s"):
-            articles = articles.filter(content__contains=s)
+            articles = article_index.search(articles, s)
 
         articles = Paginator(articles, 6)
         try:
@@ -31,8 +32,7 @@ class BlogDetailView(View):
 
         try:
             article = Article.objects.get(status=True, search=search)
-            article.views += 1
-            article.save()
+            article.views += view_counter.hit(article, visitor_id(request))
             comments = Comments.objects.filter(status=True, article=article)
             comments = Paginator(comments, 4)
             page_number = request.GET.get("page")
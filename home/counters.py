@@ -0,0 +1,168 @@
+import atexit
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F
+
+from accounts.models import school_today
+
+logger = logging.getLogger(__name__)
+
+
+class HyperLogLog:
+    """
+    fixed size sketch that estimates how many distinct strings were added to
+    it. it keeps 2 ** precision one byte registers, 2 KB by default, with a
+    standard error of about 1.04 / sqrt(2 ** precision) (2.3%). sketches
+    merge without loss, so daily sketches add up to weekly and monthly ones.
+    """
+
+    def __init__(self, registers=None, precision=11):
+        if registers:
+            self.registers = bytearray(registers)
+            self.precision = len(self.registers).bit_length() - 1
+        else:
+            self.registers = bytearray(1 << precision)
+            self.precision = precision
+
+    def add(self, value):
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+        bits = int.from_bytes(digest, "little")
+        index = bits & (len(self.registers) - 1)
+        # position of the first 1 bit in the rest of the hash
+        rank = 64 - self.precision - (bits >> self.precision).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        m = len(self.registers)
+        estimate = (
+            0.7213 / (1 + 1.079 / m) * m * m / sum(2.0**-r for r in self.registers)
+        )
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # linear counting is more accurate for small sets
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def __bytes__(self):
+        return bytes(self.registers)
+
+
+def visitor_id(request):
+    """
+    the session key, or for visitors without a session a hash of their
+    address and browser. the value only ever reaches a sketch as a hash.
+    """
+    if request.session.session_key:
+        return request.session.session_key
+    fingerprint = "|".join(
+        (request.META.get("REMOTE_ADDR", ""), request.META.get("HTTP_USER_AGENT", ""))
+    )
+    return hashlib.blake2b(fingerprint.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ViewCounter:
+    """
+    page views waiting to be added to the `views` column of their object.
+    views of the same object are summed while they wait, and a background
+    thread writes them every `interval` seconds with one
+    `views = views + n` update per object, all in a single transaction.
+    a crash loses at most the views of one interval.
+
+    the visitors of each object are also added to a HyperLogLog sketch of the
+    day, which is merged into the object's `visitor_sketches` row on flush.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._pending = Counter()
+        self._visitors = defaultdict(HyperLogLog)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def hit(self, obj, visitor=None):
+        """
+        count one view of `obj` and return how many of its views are still
+        waiting, so the page can show `obj.views` plus that number.
+        """
+        key = (obj._meta.model, obj.pk)
+        with self._lock:
+            self._pending[key] += 1
+            if visitor is not None:
+                self._visitors[(*key, school_today())].add(visitor)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="view-counter", daemon=True
+                )
+                self._thread.start()
+            return self._pending[key]
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+            connections.close_all()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, Counter()
+            visitors, self._visitors = self._visitors, defaultdict(HyperLogLog)
+        if not batch and not visitors:
+            return
+        try:
+            with transaction.atomic():
+                for (model, pk), count in batch.items():
+                    # update() skips save signals, so cached pages stay valid
+                    model._base_manager.filter(pk=pk).update(views=F("views") + count)
+                # the updates above already hold the sqlite write lock, so no
+                # other process can merge into the same sketches meanwhile
+                self._merge_sketches(visitors)
+        except DatabaseError:
+            logger.exception("Error writing views of %d objects", len(batch))
+            with self._lock:
+                self._pending.update(batch)
+                for key, sketch in visitors.items():
+                    self._visitors[key].merge(sketch)
+
+    @staticmethod
+    def _merge_sketches(visitors):
+        by_model = defaultdict(dict)
+        for (model, pk, date), sketch in visitors.items():
+            by_model[model][(pk, date)] = sketch
+        for model, sketches in by_model.items():
+            sketch_model = model.visitor_sketches.rel.related_model
+            target = sketch_model.target_field
+            stored = sketch_model.objects.select_for_update().filter(
+                **{f"{target}_id__in": {pk for pk, _ in sketches}},
+                date__in={date for _, date in sketches},
+            )
+            for row in stored:
+                key = (getattr(row, f"{target}_id"), row.date)
+                if key in sketches:
+                    sketches[key].merge(HyperLogLog(row.sketch))
+            sketch_model.objects.bulk_create(
+                [
+                    sketch_model(
+                        **{f"{target}_id": pk}, date=date, sketch=bytes(sketch)
+                    )
+                    for (pk, date), sketch in sketches.items()
+                ],
+                update_conflicts=True,
+                unique_fields=[target, "date"],
+                update_fields=["sketch"],
+            )
+
+
+view_counter = ViewCounter(getattr(settings, "VIEW_COUNT_FLUSH_INTERVAL", 5))
+atexit.register(view_counter.flush)
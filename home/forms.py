@@ -5,7 +5,7 @@ from accounts.models import TeacherContact
 class TeacherContactForm(forms.ModelForm):
     class Meta:
         model = TeacherContact
-        exclude = ("created_date",)
+        exclude = ("created_date", "is_read")
 
         widgets = {
             "student_name": forms.TextInput(
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:49
+
+import django.db.models.deletion
+import django_jalali.db.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NewsVisitors",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", django_jalali.db.models.jDateField(verbose_name="روز")),
+                ("sketch", models.BinaryField(verbose_name="بازدیدکنندگان")),
+                (
+                    "news",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="visitor_sketches",
+                        to="home.news",
+                        verbose_name="خبر",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "بازدیدکنندگان خبر",
+                "verbose_name_plural": "بازدیدکنندگان خبرها",
+                "ordering": ("-date",),
+                "abstract": False,
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("news", "date"), name="unique_news_visitors_per_day"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+from home.search import SearchIndex
+
+# frozen copy of news_index in home/models.py
+news_index = SearchIndex(
+    "home_news_fts", ("title", "subject", "content"), html=("content",)
+)
+
+
+def index_news(apps, schema_editor):
+    News = apps.get_model("home", "News")
+    news_index.rebuild(News.objects.using(schema_editor.connection.alias))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("home", "0002_newsvisitors"),
+    ]
+
+    operations = [
+        migrations.RunSQL(news_index.create_sql(), news_index.drop_sql()),
+        migrations.RunPython(index_news, migrations.RunPython.noop),
+    ]
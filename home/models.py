@@ -1,6 +1,13 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
 from django_jalali.db import models as jmodels
+from accounts.models import bump_cache_versions, cache_version, school_today
+from collections import defaultdict
+from datetime import timedelta
+from .counters import HyperLogLog
+from .search import SearchIndex
 
 
 User = get_user_model()
@@ -30,6 +37,66 @@ class News(models.Model):
         return self.title
 
 
+class VisitorSketch(models.Model):
+    """
+    HyperLogLog sketch of the visitors of one object on one day, see
+    home.counters. concrete models add a foreign key named `target_field`
+    with related_name="visitor_sketches".
+    """
+
+    target_field = None
+
+    date = jmodels.jDateField(verbose_name="روز")
+    sketch = models.BinaryField(verbose_name="بازدیدکنندگان")
+
+    class Meta:
+        abstract = True
+        ordering = ("-date",)
+
+    @classmethod
+    def attach_totals(cls, objects, week=7, month=30):
+        """
+        set `visitors_week` and `visitors_month` on each object, the unique
+        visitors of the last `week` and `month` days, with one query.
+        """
+        today = school_today()
+        week_start = today - timedelta(days=week - 1)
+        weekly, monthly = defaultdict(HyperLogLog), defaultdict(HyperLogLog)
+        rows = cls.objects.filter(
+            **{f"{cls.target_field}__in": objects},
+            date__gte=today - timedelta(days=month - 1),
+        ).values_list(f"{cls.target_field}_id", "date", "sketch")
+        for target_id, date, sketch in rows:
+            sketch = HyperLogLog(sketch)
+            monthly[target_id].merge(sketch)
+            if date >= week_start:
+                weekly[target_id].merge(sketch)
+        for obj in objects:
+            obj.visitors_week = weekly[obj.pk].count() if obj.pk in weekly else 0
+            obj.visitors_month = monthly[obj.pk].count() if obj.pk in monthly else 0
+        return objects
+
+
+class NewsVisitors(VisitorSketch):
+    target_field = "news"
+
+    news = models.ForeignKey(
+        News,
+        on_delete=models.CASCADE,
+        related_name="visitor_sketches",
+        verbose_name="خبر",
+    )
+
+    class Meta(VisitorSketch.Meta):
+        verbose_name = "بازدیدکنندگان خبر"
+        verbose_name_plural = "بازدیدکنندگان خبرها"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["news", "date"], name="unique_news_visitors_per_day"
+            )
+        ]
+
+
 class Image(models.Model):
     title = models.CharField(max_length=250, verbose_name="عنوان")
     category = models.ManyToManyField("GalleryCategories", related_name="images")
@@ -72,3 +139,37 @@ class ContactUs(models.Model):
 
     def __str__(self):
         return self.full_name
+
+
+def home_version():
+    return cache_version("home-version")
+
+
+@receiver([post_save, post_delete], sender=News)
+@receiver([post_save, post_delete], sender=Image)
+@receiver([post_save, post_delete], sender=GalleryCategories)
+@receiver([post_save, post_delete], sender="blog.Article")
+@receiver(m2m_changed, sender=Image.category.through)
+def update_home(sender, **kwargs):
+    # صفحه اصلی فقط از این مدل ها ساخته می شود
+    bump_cache_versions(["home-version"])
+
+
+news_index = SearchIndex(
+    "home_news_fts",
+    ("title", "subject", "content"),
+    html=("content",),
+    weights=(10.0, 5.0, 1.0),
+)
+
+
+@receiver(post_save, sender=News)
+def index_news(sender, instance, using, update_fields, **kwargs):
+    if update_fields and not update_fields & set(news_index.columns):
+        return
+    news_index.update([instance], using)
+
+
+@receiver(post_delete, sender=News)
+def unindex_news(sender, instance, using, **kwargs):
+    news_index.delete([instance.pk], using)
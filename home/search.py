@@ -0,0 +1,159 @@
+import html
+import re
+
+from django.db import connections
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import mark_safe
+
+# arabic letters that persian keyboards and pasted text mix with persian ones
+PERSIAN_LETTERS = str.maketrans({"ي": "ی", "ى": "ی", "ك": "ک", "ۀ": "ه", "ة": "ه"})
+WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text):
+    return text.translate(PERSIAN_LETTERS)
+
+
+class SearchIndex:
+    """
+    sqlite fts5 table holding the plain text of one model, with the primary
+    key of each object as its rowid. `html` columns are stored without their
+    markup, so searches only match the text a reader sees. the table is kept
+    in sync by the post_save and post_delete receivers of the model.
+    """
+
+    def __init__(self, table, columns, html=(), weights=None):
+        self.table = table
+        self.columns = columns
+        self.html = html
+        # bm25 weight of each column, a match in the title counts the most
+        self.weights = weights or (1.0,) * len(columns)
+
+    def create_sql(self):
+        return (
+            f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+            f"{', '.join(self.columns)}, tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def drop_sql(self):
+        return f"DROP TABLE IF EXISTS {self.table}"
+
+    def document(self, obj):
+        values = []
+        for column in self.columns:
+            value = getattr(obj, column) or ""
+            if column in self.html:
+                value = html.unescape(strip_tags(value))
+            values.append(normalize(value))
+        return values
+
+    def update(self, objects, using="default"):
+        objects = list(objects)
+        self.delete([obj.pk for obj in objects], using)
+        with connections[using].cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, {', '.join(self.columns)}) "
+                f"VALUES (%s{', %s' * len(self.columns)})",
+                [(obj.pk, *self.document(obj)) for obj in objects],
+            )
+
+    def delete(self, pks, using="default"):
+        with connections[using].cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {self.table} WHERE rowid = %s", [(pk,) for pk in pks]
+            )
+
+    def rebuild(self, queryset, chunk_size=500):
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+        chunk = []
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(obj)
+            if len(chunk) == chunk_size:
+                self.update(chunk, queryset.db)
+                chunk = []
+        self.update(chunk, queryset.db)
+
+    def search(self, queryset, query):
+        """
+        objects of `queryset` matching every word of `query` (the last one
+        as a prefix), best matches first. the result can be paginated, and
+        only the objects of the requested page are loaded from the database.
+        """
+        return SearchResults(self, queryset, match_expression(query))
+
+
+def match_expression(query):
+    words = WORD_RE.findall(normalize(query))
+    if not words:
+        return None
+    # every word is quoted so fts5 operators typed by the user stay plain text
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+class SearchResults:
+    """
+    ranked matches of a search, sliceable like a queryset so Paginator can
+    use it. the ranking needs only the rowids of the fts table, while the
+    objects and their highlighted `search_snippet` are fetched per slice.
+    """
+
+    def __init__(self, index, queryset, match):
+        self.index = index
+        self.queryset = queryset
+        self.match = match
+        self._ids = None
+
+    @property
+    def ids(self):
+        if self._ids is None:
+            self._ids = []
+            if self.match is not None:
+                pks, params = self.queryset.values("pk").query.sql_with_params()
+                with connections[self.queryset.db].cursor() as cursor:
+                    cursor.execute(
+                        f"SELECT rowid FROM {self.index.table} "
+                        f"WHERE {self.index.table} MATCH %s AND rowid IN ({pks}) "
+                        f"ORDER BY bm25({self.index.table}, "
+                        f"{', '.join(map(str, self.index.weights))})",
+                        (self.match, *params),
+                    )
+                    self._ids = [row[0] for row in cursor.fetchall()]
+        return self._ids
+
+    def count(self):
+        return len(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self[key : key + 1][0]
+        ids = self.ids[key]
+        if not ids:
+            return []
+        objects = self.queryset.in_bulk(ids)
+        snippets = self.snippets(ids)
+        results = []
+        for pk in ids:
+            if obj := objects.get(pk):
+                obj.search_snippet = snippets.get(pk, "")
+                results.append(obj)
+        return results
+
+    def snippets(self, ids):
+        table = self.index.table
+        with connections[self.queryset.db].cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({table}, -1, char(2), char(3), '…', 24) "
+                f"FROM {table} WHERE {table} MATCH %s "
+                f"AND rowid IN ({', '.join(['%s'] * len(ids))})",
+                (self.match, *ids),
+            )
+            return {
+                pk: mark_safe(
+                    escape(snippet).replace("\x02", "<mark>").replace("\x03", "</mark>")
+                )
+                for pk, snippet in cursor.fetchall()
+            }
@@ -1,3 +1,226 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User
+
+from .counters import HyperLogLog, ViewCounter
+from .models import ContactUs, News, NewsVisitors, home_version, news_index
+from .search import match_expression
+
+LOCMEM_CACHE = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "sessions": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "sessions",
+    },
+}
+
+
+class MatchExpressionTests(SimpleTestCase):
+    def test_words_are_quoted_and_the_last_is_a_prefix(self):
+        self.assertEqual(match_expression("اردوی مشهد"), '"اردوی" "مشهد"*')
+
+    def test_fts5_syntax_is_plain_text(self):
+        self.assertEqual(
+            match_expression('title:x OR "y" NEAR(z) * -w ^v'),
+            '"title" "x" "OR" "y" "NEAR" "z" "w" "v"*',
+        )
+
+    def test_arabic_letters_become_persian(self):
+        self.assertEqual(match_expression("كتاب عربي"), '"کتاب" "عربی"*')
+
+    def test_query_without_words(self):
+        self.assertIsNone(match_expression(""))
+        self.assertIsNone(match_expression('" * ( ) :'))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class NewsSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user("author", "password123")
+        cls.body = News.objects.create(
+            author=author,
+            title="برنامه هفته",
+            content='<p class="ریاضی">المپیاد <b>ریاضي</b> &amp; فیزیک</p>',
+            subject="آموزشی",
+            image="news/a.jpg",
+            status=True,
+        )
+        cls.title = News.objects.create(
+            author=author,
+            title="نتایج ریاضی",
+            content="<p>خبر</p>",
+            subject="آموزشی",
+            image="news/b.jpg",
+            status=True,
+        )
+
+    def search(self, query):
+        return news_index.search(News.objects.filter(status=True), query)
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.search("ریاضی").ids, [self.title.pk, self.body.pk])
+
+    def test_markup_is_not_indexed(self):
+        self.assertEqual(self.search("class").ids, [])
+        self.assertEqual(self.search("amp").ids, [])
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        results = self.search("المپیاد")
+        (news,) = results[0:1]
+        self.assertEqual(news, self.body)
+        self.assertEqual(news.search_snippet, "<mark>المپیاد</mark> ریاضی &amp; فیزیک")
+
+    def test_index_follows_saves_and_deletes(self):
+        self.title.title = "نتایج شیمی"
+        self.title.save()
+        self.assertEqual(self.search("ریاضی").ids, [self.body.pk])
+        self.body.delete()
+        self.assertEqual(self.search("ریاضی").ids, [])
+
+    def test_queryset_filters_apply(self):
+        News.objects.filter(pk=self.body.pk).update(status=False)
+        self.assertEqual(self.search("ریاضی").ids, [self.title.pk])
+
+
+class HyperLogLogTests(SimpleTestCase):
+    def test_estimate_is_within_the_error(self):
+        sketch = HyperLogLog()
+        for i in range(20000):
+            sketch.add(f"visitor-{i}")
+        # about 2.3% standard error, 3 standard errors leave room for the hash
+        self.assertAlmostEqual(sketch.count(), 20000, delta=20000 * 0.07)
+
+    def test_small_sets_are_nearly_exact(self):
+        sketch = HyperLogLog()
+        for i in range(50):
+            sketch.add(str(i))
+            sketch.add(str(i))
+        self.assertAlmostEqual(sketch.count(), 50, delta=2)
+
+    def test_merge_and_bytes_round_trip(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(1000):
+            first.add(f"a{i}")
+            second.add(f"b{i}")
+        merged = HyperLogLog(bytes(first)).merge(HyperLogLog(bytes(second)))
+        self.assertEqual(len(bytes(merged)), 2048)
+        self.assertAlmostEqual(merged.count(), 2000, delta=2000 * 0.07)
+        self.assertEqual(merged.count(), merged.merge(first).count())
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class HomeCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.news = News.objects.create(
+            author=User.objects.create_user("author", "password123"),
+            title="اردوی مشهد",
+            content="<p>خبر</p>",
+            subject="آموزشی",
+            image="news/a.jpg",
+            status=True,
+        )
+
+    def setUp(self):
+        self.addCleanup(caches["default"].clear)
+
+    def home(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("home:main"))
+        loaded = any("home_news" in query["sql"] for query in queries)
+        return response.content.decode(), loaded
+
+    def test_sections_are_cached_until_content_changes(self):
+        content, loaded = self.home()
+        self.assertTrue(loaded)
+        self.assertIn("اردوی مشهد", content)
+        content, loaded = self.home()
+        self.assertFalse(loaded)
+        self.assertIn("اردوی مشهد", content)
+
+        version = home_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.news.title = "اردوی شیراز"
+            self.news.save()
+        self.assertNotEqual(home_version(), version)
+        content, loaded = self.home()
+        self.assertTrue(loaded)
+        self.assertIn("اردوی شیراز", content)
+
+    def test_contact_form_leaves_the_cache_alone(self):
+        self.home()
+        version = home_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("home:main"), {})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("اردوی مشهد", response.content.decode())
+        self.assertFalse(ContactUs.objects.exists())
+        self.assertEqual(home_version(), version)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ViewCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.news = News.objects.create(
+            author=User.objects.create_user("author", "password123"),
+            title="اردوی مشهد",
+            content="<p>خبر</p>",
+            subject="آموزشی",
+            image="news/a.jpg",
+            status=True,
+            views=10,
+        )
+
+    def setUp(self):
+        # a long interval keeps the background thread away, tests flush by hand
+        self.counter = ViewCounter(3600)
+        patcher = mock.patch("home.views.view_counter", self.counter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def view(self):
+        response = self.client.get(reverse("home:news_detail", args=(self.news.pk,)))
+        return response.context["news"].views
+
+    def test_views_are_buffered_and_flushed_together(self):
+        self.assertEqual([self.view() for _ in range(3)], [11, 12, 13])
+        self.news.refresh_from_db()
+        self.assertEqual(self.news.views, 10)
+
+        with self.assertNumQueries(5):
+            self.counter.flush()
+        self.news.refresh_from_db()
+        self.assertEqual(self.news.views, 13)
+        self.assertEqual(self.view(), 14)
+
+        # one visitor came three times
+        sketch = NewsVisitors.objects.get(news=self.news).sketch
+        self.assertEqual(HyperLogLog(sketch).count(), 1)
+
+    def test_flush_does_not_bump_the_home_version(self):
+        self.view()
+        version = home_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.counter.flush()
+        self.assertEqual(home_version(), version)
+
+    def test_failed_flush_keeps_the_views(self):
+        self.view()
+        with mock.patch.object(
+            ViewCounter, "_merge_sketches", side_effect=DatabaseError
+        ), self.assertLogs("home.counters", "ERROR"):
+            self.counter.flush()
+        self.news.refresh_from_db()
+        self.assertEqual(self.news.views, 10)
+        self.counter.flush()
+        self.news.refresh_from_db()
+        self.assertEqual(self.news.views, 11)
+        self.assertTrue(NewsVisitors.objects.exists())
@@ -1,11 +1,13 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import get_user_model
 from django.views import View
-from .models import News, Image
+from .models import News, Image, home_version, news_index
+from .counters import view_counter, visitor_id
 from blog.models import Article
 from accounts.forms import ContactUsForm
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from accounts.models import Teacher, Student
+from accounts.middleware import get_role_profile
 from .forms import TeacherContactForm
 from django.contrib import messages
 from django.http import Http404
@@ -15,17 +17,24 @@ from django.core.exceptions import PermissionDenied
 User = get_user_model()
 
 
+HOME_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _home_context():
+    # کوئری ها lazy هستند و وقتی قطعه ها در کش باشند اجرا نمی شوند
+    return {
+        "news": News.objects.filter(status=True)[:3],
+        "articles": Article.objects.filter(status=True)[:3],
+        "gallerys": Image.objects.filter(status=True).prefetch_related("category")[:6],
+        "home_version": home_version(),
+        "home_timeout": HOME_CACHE_TIMEOUT,
+    }
+
+
 class HomeView(View):
     def get(self, request):
         form = ContactUsForm()
-        news = News.objects.filter(status=True)[:3]
-        articles = Article.objects.filter(status=True)[:3]
-        gallerys = Image.objects.filter(status=True)[:8]
-        return render(
-            request,
-            "home/index.html",
-            {"news": news, "articles": articles, "gallerys": gallerys, "form": form},
-        )
+        return render(request, "home/index.html", {"form": form, **_home_context()})
 
     def post(self, request):
 
@@ -40,7 +49,7 @@ class HomeView(View):
             messages.add_message(
                 request, messages.ERROR, "تمامی قسمت ها به درستی پر شوند."
             )
-        return render(request, "home/index.html", {"form": form})
+        return render(request, "home/index.html", {"form": form, **_home_context()})
 
 
 class GalleryView(View):
@@ -62,9 +71,11 @@ class NewsView(View):
     def get(self, request):
 
         news = News.objects.filter(status=True)
+        special = news.filter(special=True)
         if s := request.GET.get("s"):
-            news = news.filter(content__contains=s)
-        special = news.filter(special=True).order_by("id").last()
+            news = news_index.search(news, s)
+            special = special.filter(pk__in=news.ids)
+        special = special.order_by("id").last()
 
         news = Paginator(news, 6)
         try:
@@ -82,8 +93,7 @@ class NewsDetailView(View):
     def get(self, request, pk):
         try:
             news = News.objects.get(status=True, id=pk)
-            news.views += 1
-            news.save()
+            news.views += view_counter.hit(news, visitor_id(request))
         except News.DoesNotExist:
             messages.add_message(
                 request, messages.INFO, "خبری که به دنبال ان هستید وجود ندارد."
@@ -133,7 +143,7 @@ class TeacherContactView(View):
                 try:
                     teacher = Teacher.objects.get(full_name_en=full_name_en)
                     teachers = Teacher.objects.all()
-                    student = Student.objects.get(user=user)
+                    student = get_role_profile(request, Student)
                     form = TeacherContactForm()
                     return render(
                         request,
@@ -183,7 +193,7 @@ class TeacherContactView(View):
                     form = TeacherContactForm(request.POST)
                     teacher = Teacher.objects.get(full_name_en=full_name_en)
                     teachers = Teacher.objects.all()
-                    student = Student.objects.get(user=user)
+                    student = get_role_profile(request, Student)
                     if form.is_valid():
                         form.save()
                         messages.add_message(
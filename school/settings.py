@@ -40,12 +40,20 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "accounts.middleware.RoleProfileMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
 ROOT_URLCONF = "school.urls"
 
+# ModelBackend stays last so sessions created before RoleProfileBackend
+# was added remain valid until their next login
+AUTHENTICATION_BACKENDS = [
+    "accounts.backends.RoleProfileBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -75,6 +83,42 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# shared between worker processes so invalidation reaches all of them
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache" / "default",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+    # sessions get their own directory so culling cached pages never evicts
+    # a logged in user, one entry per active session
+    "sessions": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache" / "sessions",
+        "OPTIONS": {"MAX_ENTRIES": 20000},
+    },
+}
+
+
+# Sessions
+# reads come from the cache and database writes are batched every
+# SESSION_WRITE_DELAY seconds, see accounts/sessions.py
+
+SESSION_ENGINE = "accounts.sessions"
+SESSION_CACHE_ALIAS = "sessions"
+SESSION_WRITE_DELAY = 2
+
+
+# View counters
+# news and article views are summed in memory and written every
+# VIEW_COUNT_FLUSH_INTERVAL seconds, see home/counters.py
+
+VIEW_COUNT_FLUSH_INTERVAL = 5
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 